@@ -70,13 +70,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -94,6 +100,17 @@ DATABASES = {
     }
 }
 
+# Optional category-partitioned product storage: database alias -> category ids stored there.
+# Each alias needs a DATABASES entry; run `migrate --database=<alias>`, then `partition_products`.
+# Categories that aren't listed stay in 'default'.
+# List views read every partition through FilterEngine; the Product admin only manages 'default'.
+PRODUCTS_PARTITIONS = {}
+# Threads used to query several partitions at once (0 = one after another);
+# they keep their connections open for CONN_MAX_AGE, like request threads
+PRODUCTS_PARTITION_WORKERS = 4
+
+DATABASE_ROUTERS = ['products.partitions.PartitionRouter']
+
 # Caches
 CACHES = {
     "default": {
@@ -105,6 +122,29 @@ CACHES = {
     }
 }
 
+# Speculative prefetching: render page N+1 in the background after serving page N
+PRODUCTS_PREFETCH = True
+# Also prefetch the one-click status / price bucket toggles
+PRODUCTS_PREFETCH_NEIGHBORS = False
+
+# Render product card partials with the compiled fast path (products/cards.py)
+PRODUCTS_FAST_CARDS = not DEBUG
+
+# Seconds between writes of coalesced stock deltas (0 = only on explicit drain)
+PRODUCTS_STOCK_FLUSH_INTERVAL = 1.0
+# Bearer tokens accepted by the inventory endpoint (non-browser stock producers)
+PRODUCTS_INVENTORY_TOKENS = []
+
+# Memory-mapped columnar catalog snapshot shared by all workers (build_catalog_snapshot)
+PRODUCTS_SNAPSHOT_PATH = BASE_DIR / 'catalog.snapshot'
+# Serve list pages and price bucket counts from the snapshot while it's fresh
+# (any product change marks it stale until the next build_catalog_snapshot).
+# Snapshot filters scan every row in Python: leave this off for large catalogs
+# (past a few hundred thousand products the indexed SQL queries are faster).
+PRODUCTS_SNAPSHOT_READS = False
+
+# Product admin changelist without COUNT(*): estimated counts, keyset pages, prefix search
+PRODUCTS_ADMIN_SCALABLE = True
 
 
 # Password validation
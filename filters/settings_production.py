@@ -0,0 +1,52 @@
+"""
+Production settings for filters project.
+
+Loads only what the filter views need: no debug toolbar, REST framework
+or widget_tweaks, and no per-request debug middleware.
+
+    DJANGO_SETTINGS_MODULE=filters.settings_production
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, MIDDLEWARE
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",")
+
+
+# Application definition
+
+DEV_ONLY_APPS = {
+    'rest_framework',
+    'debug_toolbar',
+    'widget_tweaks',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEV_ONLY_APPS]
+
+MIDDLEWARE = [m for m in MIDDLEWARE if not m.startswith('debug_toolbar.')]
+
+INTERNAL_IPS = []
+
+
+# Database
+
+# Persistent connections: request threads and the partition / prefetch pools
+# reuse theirs instead of reconnecting for every query
+DATABASES = {
+    alias: {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True, **database}
+    for alias, database in DATABASES.items()
+}
+
+
+# Filter views
+
+PRODUCTS_FAST_CARDS = True
+
+# Comma-separated bearer tokens for the inventory endpoint
+PRODUCTS_INVENTORY_TOKENS = [token for token in os.environ.get("PRODUCTS_INVENTORY_TOKENS", "").split(",") if token]
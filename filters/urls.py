@@ -15,7 +15,6 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-import debug_toolbar
 from django.urls import path, include
 from django.conf import settings
 
@@ -25,7 +24,8 @@ urlpatterns = [
 ]
 
 
-if settings.DEBUG:
+# Only import the toolbar when it's installed (not in settings_production)
+if settings.DEBUG and "debug_toolbar" in settings.INSTALLED_APPS:
     import debug_toolbar
     urlpatterns = [
         path('__debug__/', include(debug_toolbar.urls)),
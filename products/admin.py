@@ -1,5 +1,12 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Category, Brand, Product
+from .changelist import (
+    BrandSummaryFilter,
+    CategorySummaryFilter,
+    ScalableChangelistMixin,
+    StatusSummaryFilter,
+)
+from .models import Category, Brand, Product, ProductFacetSummary
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -9,8 +16,25 @@ class CategoryAdmin(admin.ModelAdmin):
 class BrandAdmin(admin.ModelAdmin):
     list_display = ('name',)
 
-@admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'brand', 'status', 'price', 'stock', 'created_at')
     list_filter = ('status', 'category', 'brand', 'created_at')
     search_fields = ('name',)
+
+
+class ScalableProductAdmin(ScalableChangelistMixin, ProductAdmin):
+    """
+    Product changelist for millions of rows: estimated counts, facet
+    filters counted from ProductFacetSummary, keyset pages, name prefix search.
+    """
+    list_filter = (StatusSummaryFilter, CategorySummaryFilter, BrandSummaryFilter, 'created_at')
+    search_help_text = 'Name prefix or product id'
+
+
+admin.site.register(Product, ScalableProductAdmin if getattr(settings, 'PRODUCTS_ADMIN_SCALABLE', True) else ProductAdmin)
+
+
+@admin.register(ProductFacetSummary)
+class ProductFacetSummaryAdmin(admin.ModelAdmin):
+    list_display = ('category', 'brand', 'status', 'price_bucket', 'count')
+    list_filter = ('status', 'price_bucket')
@@ -0,0 +1,180 @@
+# products/cards.py
+import re
+from html import escape
+
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.timezone import template_localtime
+
+# A card partial is "{% for product in products %}card{% empty %}none{% endfor %}"
+CARD_LOOP = re.compile(
+    r"^(?P<head>.*?){% for product in products %}(?P<body>.*?)"
+    r"{% empty %}(?P<empty>.*?){% endfor %}(?P<tail>.*)$",
+    re.S,
+)
+CARD_VARIABLE = re.compile(r"{{ product((?:\.\w+)+) }}")
+
+# template name -> CompiledCards, or None if the partial can't be compiled
+_compiled = {}
+# template name -> TemplateCards, or None if the partial isn't a plain card loop
+_split = {}
+
+
+class CompiledCards:
+    """
+    Plain-Python renderer for a product card partial, compiled from the
+    Django template source so markup stays in one place.
+    """
+
+    def __init__(self, head, body, empty, tail):
+        self.head = head
+        self.empty = empty
+        self.tail = tail
+        # body split into literal text and attribute paths: [text, path, text, ...]
+        pieces = CARD_VARIABLE.split(body)
+        self.literals = pieces[0::2]
+        self.paths = [tuple(path.strip(".").split(".")) for path in pieces[1::2]]
+
+    @classmethod
+    def from_source(cls, source):
+        match = CARD_LOOP.match(source)
+        if not match:
+            return None
+        parts = match.groupdict()
+        literal = [parts["head"], CARD_VARIABLE.sub("", parts["body"]), parts["empty"], parts["tail"]]
+        # Anything beyond plain product.attr variables needs the real template engine
+        if any("{{" in text or "{%" in text or "{#" in text for text in literal):
+            return None
+        return cls(parts["head"], parts["body"], parts["empty"], parts["tail"])
+
+    def render(self, products):
+        if not hasattr(products, "__len__"):
+            products = list(products)
+        if not len(products):
+            return self.head + self.empty + self.tail
+        literals, paths = self.literals, self.paths
+        last = literals[-1]
+        pairs = list(zip(literals, paths))
+        cards = []
+        for product in products:
+            for text, path in pairs:
+                cards.append(text)
+                cards.append(_render_value(product, path))
+            cards.append(last)
+        return self.head + "".join(cards) + self.tail
+
+    def render_each(self, products):
+        """
+        One HTML string per product card, without the partial's head and tail.
+        """
+        last = self.literals[-1]
+        pairs = list(zip(self.literals, self.paths))
+        cards = []
+        for product in products:
+            pieces = []
+            for text, path in pairs:
+                pieces.append(text)
+                pieces.append(_render_value(product, path))
+            pieces.append(last)
+            cards.append("".join(pieces))
+        return cards
+
+
+class TemplateCards:
+    """
+    A card partial split like CompiledCards, with each card rendered by the
+    template engine (PRODUCTS_FAST_CARDS off, or tags the compiler can't handle).
+    """
+
+    def __init__(self, head, body, empty, tail, backend):
+        self.head = head
+        self.empty = empty
+        self.tail = tail
+        self.body = backend.from_string(body)
+
+    @classmethod
+    def from_template(cls, template):
+        match = CARD_LOOP.match(template.template.source)
+        if not match:
+            return None
+        parts = match.groupdict()
+        # Only the card body may use tags
+        if any("{{" in parts[name] or "{%" in parts[name] or "{#" in parts[name] for name in ("head", "empty", "tail")):
+            return None
+        return cls(parts["head"], parts["body"], parts["empty"], parts["tail"], template.backend)
+
+    def render_each(self, products):
+        return [self.body.render({"product": product}) for product in products]
+
+
+def _render_value(obj, path):
+    """
+    Resolve and print an attribute path the way a {{ var }} tag does.
+    """
+    for attr in path:
+        try:
+            obj = getattr(obj, attr)
+        except AttributeError:
+            return ""  # string_if_invalid
+    if type(obj) is str:
+        return escape(obj)  # same entities as django.utils.html.escape
+    return conditional_escape(localize(template_localtime(obj)))
+
+
+def _cached(store, template_name, build):
+    """
+    build(template) for a partial, kept per process unless DEBUG is on:
+    the template autoreloader resets Django's loaders, not these caches.
+    """
+    if settings.DEBUG:
+        return build(get_template(template_name))
+    if template_name not in store:
+        store[template_name] = build(get_template(template_name))
+    return store[template_name]
+
+
+def compiled_cards(template_name):
+    return _cached(_compiled, template_name, lambda template: CompiledCards.from_source(template.template.source))
+
+
+def render_cards(template_name, products):
+    """
+    Render a product card partial, using the compiled fast path when
+    PRODUCTS_FAST_CARDS is on and the partial compiles.
+    """
+    if getattr(settings, "PRODUCTS_FAST_CARDS", False):
+        compiled = compiled_cards(template_name)
+        if compiled is not None:
+            return compiled.render(products)
+    return render_to_string(template_name, {"products": products})
+
+
+def card_renderer(template_name):
+    """
+    CompiledCards or TemplateCards for a partial (following PRODUCTS_FAST_CARDS),
+    or None when it can't be split into cards.
+    """
+    if getattr(settings, "PRODUCTS_FAST_CARDS", False):
+        compiled = compiled_cards(template_name)
+        if compiled is not None:
+            return compiled
+    return _cached(_split, template_name, TemplateCards.from_template)
+
+
+def render_card_list(template_name, products):
+    """
+    (html, [(product id, card html)]) with every card rendered once:
+    the page HTML is the cards joined between the partial's head and tail.
+    """
+    products = list(products)
+    renderer = card_renderer(template_name)
+    if renderer is None:
+        cards = [(product.id, render_to_string(template_name, {"products": [product]})) for product in products]
+        return render_to_string(template_name, {"products": products}), cards
+    cards = list(zip([product.id for product in products], renderer.render_each(products)))
+    if not cards:
+        return renderer.head + renderer.empty + renderer.tail, cards
+    return renderer.head + "".join(html for _, html in cards) + renderer.tail, cards
+
@@ -0,0 +1,281 @@
+# products/changelist.py
+from collections import namedtuple
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import (
+    ALL_VAR,
+    ERROR_FLAG,
+    IS_FACETS_VAR,
+    IS_POPUP_VAR,
+    ORDER_VAR,
+    PAGE_VAR,
+    SEARCH_VAR,
+    TO_FIELD_VAR,
+    ChangeList,
+)
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import facets, partitions
+from .models import Product
+
+# Keyset page params: the (created_at, pk) of the row to continue after / before
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+KEYSET_ORDERING = ["-created_at", "-pk"]
+
+# Filter params the facet summary can count
+SUMMARY_PARAMS = {"category", "brand", "status"}
+# Params that don't narrow the changelist
+NON_FILTER_PARAMS = {AFTER_VAR, BEFORE_VAR, ALL_VAR, ERROR_FLAG, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR}
+
+# Other counts stop here
+COUNT_LIMIT = 10000
+
+Cursor = namedtuple("Cursor", ["created_at", "pk"])
+
+
+def parse_cursor(value):
+    created_at, _, pk = (value or "").rpartition("_")
+    try:
+        created_at = parse_datetime(created_at)
+    except ValueError:
+        return None
+    if created_at is None or not pk.isdecimal():
+        return None
+    return Cursor(created_at, int(pk))
+
+
+def format_cursor(product):
+    return f"{product.created_at.isoformat()}_{product.pk}"
+
+
+# -- Counts --
+def summary_filter_values(params, exclude=None):
+    """
+    {"category": [ids], "brand": [ids], "status": [values]} from the summary filter params.
+    """
+    values = {
+        name: [params[name]] if params.get(name) and name != exclude else None
+        for name in SUMMARY_PARAMS
+    }
+    for name in ("category", "brand"):
+        if values[name] and not values[name][0].isdecimal():
+            raise IncorrectLookupParameters(f"Invalid {name} id")
+    return values
+
+
+def changelist_cells(params, exclude=None):
+    """
+    Summary cells for the changelist's filters. The admin reads the default
+    database only, so categories stored in partitions are left out.
+    """
+    cells = facets.summary_cells(**summary_filter_values(params, exclude))
+    elsewhere = [pk for alias in partitions.partition_databases() for pk in partitions.partition_settings()[alias]]
+    return cells.exclude(category_id__in=elsewhere) if elsewhere else cells
+
+
+def bounded_count(queryset, limit=COUNT_LIMIT):
+    """
+    COUNT over at most limit + 1 rows: (count, exact).
+    """
+    count = queryset.order_by().values("pk")[:limit + 1].count()
+    return min(count, limit), count <= limit
+
+
+def estimate_count(params, queryset):
+    """
+    (count, exact) for a changelist: summed from ProductFacetSummary when only
+    summary filters are active, otherwise a bounded COUNT.
+    """
+    active = {name for name, value in params.items() if value}
+    if active <= SUMMARY_PARAMS:
+        cells = changelist_cells(params)
+        return sum(cells.values_list("count", flat=True)), True
+    return bounded_count(queryset)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes its count from an estimate() -> (count, exact)
+    callable instead of running COUNT(*) over the whole queryset.
+    """
+
+    def __init__(self, object_list, per_page, estimate, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.estimate = estimate
+        self.exact = True
+
+    @cached_property
+    def count(self):
+        count, self.exact = self.estimate()
+        return count
+
+
+# -- Search --
+def name_prefix_search(queryset, term):
+    """
+    Products whose name starts with `term` (any case), or whose id is `term`.
+    A range over the Lower("name") index instead of a LIKE '%term%' scan.
+    """
+    term = term.strip().lower()
+    if not term:
+        return queryset
+    matches = Q(name_lower__gte=term, name_lower__lt=term + "\U0010ffff")
+    if term.isdecimal():
+        matches |= Q(pk=int(term))
+    return queryset.annotate(name_lower=Lower("name")).filter(matches)
+
+
+# -- Facet filters --
+class SummaryFacetFilter(admin.SimpleListFilter):
+    """
+    Single-choice list filter whose choices show product counts from
+    ProductFacetSummary, narrowed by the other summary filters.
+    Subclasses name the facets function that groups the cells and the
+    columns of its rows holding the choice value and label.
+    """
+    lookup = None
+    facet = None        # e.g. staticmethod(facets.category_facets)
+    value_field = None  # e.g. "category__id"
+    label_field = None  # defaults to value_field
+    labels = None       # optional {value: label} for the label column
+
+    def lookups(self, request, model_admin):
+        cells = changelist_cells(request.GET, exclude=self.parameter_name)
+        return [(str(value), f"{label} ({count})") for value, label, count in self.counts(cells)]
+
+    def counts(self, cells):
+        """
+        (value, label, count) for every non-empty choice.
+        """
+        labels = self.labels or {}
+        label_field = self.label_field or self.value_field
+        return [
+            (row[self.value_field], labels.get(row[label_field], row[label_field]), row["count"])
+            for row in self.facet(cells)
+            if row[self.value_field] is not None
+        ]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if self.lookup.endswith("_id") and not value.isdecimal():
+            raise IncorrectLookupParameters(f"Invalid {self.parameter_name} id")
+        return queryset.filter(**{self.lookup: value})
+
+
+class CategorySummaryFilter(SummaryFacetFilter):
+    title = "category"
+    parameter_name = "category"
+    lookup = "category_id"
+    facet = staticmethod(facets.category_facets)
+    value_field = "category__id"
+    label_field = "category__name"
+
+
+class BrandSummaryFilter(SummaryFacetFilter):
+    title = "brand"
+    parameter_name = "brand"
+    lookup = "brand_id"
+    facet = staticmethod(facets.brand_facets)
+    value_field = "brand__id"
+    label_field = "brand__name"
+
+
+class StatusSummaryFilter(SummaryFacetFilter):
+    title = "status"
+    parameter_name = "status"
+    lookup = "status"
+    facet = staticmethod(facets.status_facets)
+    value_field = "status"
+    labels = dict(Product.STATUS_CHOICES)
+
+
+# -- Keyset pages --
+class KeysetChangeList(ChangeList):
+    """
+    Changelist that pages by (created_at, pk) cursors instead of OFFSET while
+    the default newest-first ordering is used. Sorted columns and "Show all"
+    fall back to numbered pages.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = parse_cursor(request.GET.get(AFTER_VAR))
+        self.before = None if self.after else parse_cursor(request.GET.get(BEFORE_VAR))
+        self.keyset = False
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and sort links start again from the newest products
+        return super().get_query_string(new_params, [*(remove or []), AFTER_VAR, BEFORE_VAR])
+
+    def get_results(self, request):
+        super().get_results(request)  # counts only, the page slice stays lazy
+        self.result_count_exact = self.paginator.exact
+        ordering = list(dict.fromkeys(self.queryset.query.order_by))  # the admin repeats ModelAdmin.ordering
+        if self.show_all or ORDER_VAR in self.params or ordering != KEYSET_ORDERING:
+            return
+        self.keyset = True
+
+        per_page = self.list_per_page
+        queryset = self.queryset
+        if self.before:
+            created_at, pk = self.before
+            newer = Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            rows = list(queryset.filter(newer).reverse()[:per_page + 1])
+            has_newer, has_older = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+        else:
+            if self.after:
+                created_at, pk = self.after
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            rows = list(queryset[:per_page + 1])
+            has_newer, has_older = self.after is not None, len(rows) > per_page
+            rows = rows[:per_page]
+
+        self.result_list = rows
+        self.multi_page = has_newer or has_older
+        self.first_url = self.newer_url = self.older_url = None
+        if has_newer:
+            self.first_url = self.get_query_string()
+            self.newer_url = self.get_query_string({BEFORE_VAR: format_cursor(rows[0])}) if rows else self.first_url
+        if has_older and rows:
+            self.older_url = self.get_query_string({AFTER_VAR: format_cursor(rows[-1])})
+
+
+class ScalableChangelistMixin:
+    """
+    ModelAdmin settings for very large product tables: no full COUNT(*),
+    summary-backed facet filters, keyset pages and indexed name search.
+    """
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ("-created_at",)
+    list_select_related = ("category", "brand")  # brand is nullable, so select_related() alone skips it
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        params = {name: value for name, value in request.GET.items() if name not in NON_FILTER_PARAMS}
+        if not params.get(SEARCH_VAR, "").strip():
+            params.pop(SEARCH_VAR, None)
+        return EstimatedCountPaginator(
+            queryset, per_page, lambda: estimate_count(params, queryset),
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        return name_prefix_search(queryset, search_term), False
@@ -0,0 +1,228 @@
+# products/engine.py
+from decimal import Decimal, InvalidOperation
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import facets, partitions, snapshot
+from .models import PRICE_BUCKETS, Product
+from .optimizations import cached_entry
+from .rows import ProductRows, brand_names, category_names
+
+
+def _ids(values):
+    return [int(v) for v in values if v.isdecimal()]
+
+
+def _decimal(value):
+    try:
+        number = Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+    # NaN / Infinity parse, but can't be compared with prices
+    return number if number is not None and number.is_finite() else None
+
+
+def parse_price_bucket(value):
+    """
+    (low, high) for a PRICE_BUCKETS key or a custom "low_high" pair, else None.
+    """
+    if value in PRICE_BUCKETS:
+        return PRICE_BUCKETS[value]
+    if value and "_" in value:
+        low, _, high = value.partition("_")
+        if low.isdecimal() and high.isdecimal():
+            return int(low), int(high)
+    return None
+
+
+def price_range_q(low, high):
+    """
+    low <= price < high, with the top bucket also including its upper bound
+    (the same cells ProductFacetSummary counts).
+    """
+    q = Q(price__gte=low, price__lt=high)
+    if high == 1000:
+        q |= Q(price=high)
+    return q
+
+
+class FilterEngine:
+    """
+    Parses the filter GET params once and builds the product query
+    shared by every filter view.
+
+    - category: ids (multi-select) or names (manual form)
+    - brand: ids, repeated params are OR'ed
+    - status: values, repeated params are OR'ed
+    - price_bucket: PRICE_BUCKETS key or "low_high"
+    - min_price / max_price: decimals, invalid values are ignored
+    """
+
+    # Columns the product cards render
+    list_fields = ("name", "price", "category__name", "brand__name")
+    ordering = ("-created_at",)
+
+    def __init__(self, params, per_page=32, lean=True):
+        self.params = params
+        self.per_page = per_page
+        # Page rows as ProductRow (values_list + name lookups) instead of models
+        self.lean = lean
+
+        categories = [c.strip() for c in params.getlist("category") if c.strip()]
+        self.category_ids = _ids(categories)
+        self.category_names = [c for c in categories if not c.isdecimal()]
+        self.statuses = [s.strip() for s in params.getlist("status") if s.strip()]
+        self.brand_ids = _ids(params.getlist("brand"))
+
+        bucket = params.get("price_bucket") or ""
+        self.price_range = parse_price_bucket(bucket)
+        self.price_bucket = bucket if self.price_range else None
+        self.min_price = _decimal(params.get("min_price"))
+        self.max_price = _decimal(params.get("max_price"))
+
+    @classmethod
+    def base_queryset(cls):
+        """
+        One query per page: related names joined, only the card columns loaded.
+        """
+        return (
+            Product.objects.select_related("category", "brand")
+            .only(*cls.list_fields)
+            .order_by(*cls.ordering)
+        )
+
+    def get_filters(self):
+        filters = Q()
+        if self.category_ids or self.category_names:
+            category_q = Q()
+            if self.category_ids:
+                category_q |= Q(category__id__in=self.category_ids)
+            if self.category_names:
+                category_q |= Q(category__name__in=self.category_names)
+            filters &= category_q
+        if self.statuses:
+            filters &= Q(status__in=self.statuses)
+        if self.brand_ids:
+            filters &= Q(brand__id__in=self.brand_ids)
+        if self.price_range:
+            filters &= price_range_q(*self.price_range)
+        if self.min_price is not None:
+            filters &= Q(price__gte=self.min_price)
+        if self.max_price is not None:
+            filters &= Q(price__lte=self.max_price)
+        return filters
+
+    @cached_property
+    def queryset(self):
+        return self.base_queryset().filter(self.get_filters())
+
+    # -- Partitions hook --
+    @cached_property
+    def partitions(self):
+        """
+        Databases holding matching products: with PRODUCTS_PARTITIONS set,
+        a category filter only touches its categories' partitions.
+        """
+        if not partitions.is_partitioned():
+            return [self.queryset.db]
+        if self.category_ids or self.category_names:
+            return partitions.aliases_for_categories(ref.id for ref in self.active_filters["category"])
+        return partitions.partition_aliases()
+
+    # -- Pagination hook --
+    @cached_property
+    def page(self):
+        """
+        The requested page; invalid or out-of-range numbers fall back like get_page().
+        """
+        if self.snapshot_rows is not None:
+            object_list = snapshot.SnapshotRows(
+                self.snapshot, self.snapshot_rows, self.queryset, self.partitions, lean=self.lean
+            )
+        elif len(self.partitions) == 1:
+            queryset = self.queryset.using(self.partitions[0])
+            object_list = ProductRows(queryset) if self.lean else queryset
+        else:
+            object_list = partitions.PartitionedRows(self.queryset, self.partitions, lean=self.lean)
+        return Paginator(object_list, self.per_page).get_page(self.params.get("page"))
+
+    # -- Snapshot hook --
+    @cached_property
+    def snapshot(self):
+        """
+        The shared catalog snapshot when PRODUCTS_SNAPSHOT_READS is on and
+        fresh; category names aren't stored in it, so those filters skip it.
+        """
+        if self.category_names:
+            return None
+        return snapshot.readable_snapshot()
+
+    @cached_property
+    def snapshot_rows(self):
+        """
+        Snapshot positions of the matching products, newest first, or None.
+        """
+        if self.snapshot is None:
+            return None
+        return self.snapshot.matching(
+            self.category_ids, self.brand_ids, self.statuses, self.price_range,
+            min_price=self.min_price, max_price=self.max_price,
+        )
+
+    # -- Active filter tags --
+    @cached_property
+    def active_filters(self):
+        return {
+            "category": category_names.filter(ids=self.category_ids, names=self.category_names),
+            "status": [sts for sts in Product.STATUS_CHOICES if sts[0] in self.statuses],
+            "brand": brand_names.filter(ids=self.brand_ids),
+            "price_bucket": self.price_bucket,
+        }
+
+    def selection_context(self):
+        """
+        Selected values the sidebars use to re-check their inputs.
+        """
+        return {
+            "selected_categories": self.category_ids,
+            "selected_statuses": self.statuses,
+            "selected_brands": self.brand_ids,
+            "price_bucket": self.price_bucket,
+            "selected_brand": self.params.get("brand"),
+        }
+
+    # -- Caching hook --
+    def cached_entry(self, request, prefix, render):
+        return cached_entry(request, prefix, render)
+
+    # -- Facets hook --
+    def facet_cells(self):
+        """
+        Summary cells matching the filters, or None when a filter
+        (names, min/max price, custom buckets) can't be answered by the summary.
+        """
+        if self.category_names or self.min_price is not None or self.max_price is not None:
+            return None
+        if self.price_range and self.price_bucket not in PRICE_BUCKETS:
+            return None
+        return facets.summary_cells(
+            category=self.category_ids,
+            brand=self.brand_ids,
+            status=self.statuses,
+            price_bucket=self.price_bucket,
+        )
+
+    def price_bucket_counts(self):
+        """
+        `p_<bucket>` counts for the matching products from the summary, else
+        the snapshot, or None when neither can answer the filters.
+        """
+        cells = self.facet_cells()
+        if cells is not None:
+            return facets.price_bucket_facets(cells)
+        if self.snapshot_rows is None:
+            return None
+        counts = self.snapshot.price_bucket_counts(self.snapshot_rows)
+        return {f"p_{key}": counts[key] for key in PRICE_BUCKETS}
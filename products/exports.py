@@ -0,0 +1,89 @@
+# products/exports.py
+import csv
+import io
+import json
+
+from .rows import brand_names, category_names
+
+# Exported columns, in output order
+EXPORT_FIELDS = ("id", "name", "category", "brand", "status", "price", "stock", "created_at")
+# Columns anyone may export: inventory levels need the view_product permission
+PUBLIC_EXPORT_FIELDS = tuple(field for field in EXPORT_FIELDS if field != "stock")
+
+
+def iter_export_rows(queryset, chunk_size=2000, aliases=None, fields=EXPORT_FIELDS):
+    """
+    Yield one dict of `fields` per matching product, walking the table in
+    primary-key order one keyset chunk at a time so memory stays constant.
+    `aliases` lists the partition databases to walk, one after another.
+    """
+    columns = ("id", "name", "category_id", "brand_id", "status", "price", "stock", "created_at")
+    for alias in aliases or [queryset.db]:
+        rows = queryset.using(alias).order_by("pk").values_list(*columns)
+        for row in _iter_keyset(rows, chunk_size):
+            yield {field: row[field] for field in fields}
+
+
+def _iter_keyset(rows, chunk_size):
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size].iterator(chunk_size=chunk_size))
+        for pk, name, category_id, brand_id, status, price, stock, created_at in chunk:
+            category = category_names.get(category_id)
+            brand = brand_names.get(brand_id)
+            yield {
+                "id": pk,
+                "name": name,
+                "category": category.name if category else "",
+                "brand": brand.name if brand else "",
+                "status": status,
+                "price": str(price),
+                "stock": stock,
+                "created_at": created_at.isoformat(),
+            }
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1][0]
+
+
+def csv_chunks(rows, batch=500, fields=EXPORT_FIELDS):
+    """
+    Encode rows as CSV, header first, yielding a string every `batch` rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    yield _drain(buffer)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def jsonl_chunks(rows, batch=500, fields=EXPORT_FIELDS):
+    """
+    Encode rows as JSON Lines, yielding a string every `batch` rows.
+    """
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False))
+        if len(lines) == batch:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+# format -> (encoder, content type, file extension)
+EXPORT_FORMATS = {
+    "csv": (csv_chunks, "text/csv", "csv"),
+    "jsonl": (jsonl_chunks, "application/x-ndjson", "jsonl"),
+}
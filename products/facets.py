@@ -0,0 +1,151 @@
+# products/facets.py
+# The summary follows Model.save()/delete() through products.signals.
+# bulk_create(), QuerySet.update()/delete() and raw SQL skip those signals:
+# run `manage.py rebuild_facet_summary` after bulk changes.
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+
+from .models import PRICE_BUCKETS, Product, ProductFacetSummary, price_bucket_for
+from .partitions import partition_aliases
+
+
+def facet_cell(product):
+    """
+    Return the summary cell a product is counted in.
+    """
+    return {
+        "category_id": product.category_id,
+        "brand_id": product.brand_id,
+        "status": product.status,
+        "price_bucket": price_bucket_for(product.price),
+    }
+
+
+def bump_cell(cell, delta):
+    """
+    Add `delta` to a summary cell, creating it on first use.
+    """
+    updated = ProductFacetSummary.objects.filter(**cell).update(count=F("count") + delta)
+    if not updated and delta > 0:
+        obj, created = ProductFacetSummary.objects.get_or_create(**cell, defaults={"count": delta})
+        if not created:
+            ProductFacetSummary.objects.filter(pk=obj.pk).update(count=F("count") + delta)
+
+
+def merge_unbranded_cells():
+    """
+    Fold duplicate brand-less cells into one. Deleting a Brand nulls its cells
+    (SET_NULL), and the unique constraint doesn't treat NULL brands as equal.
+    """
+    duplicates = (
+        ProductFacetSummary.objects.filter(brand__isnull=True)
+        .values("category_id", "status", "price_bucket")
+        .annotate(cells=Count("id"), total=Sum("count"))
+        .filter(cells__gt=1)
+        .order_by()
+    )
+    with transaction.atomic():
+        for row in duplicates:
+            cells = ProductFacetSummary.objects.filter(
+                brand__isnull=True,
+                category_id=row["category_id"],
+                status=row["status"],
+                price_bucket=row["price_bucket"],
+            ).order_by("id")
+            keep = cells.first()
+            cells.exclude(pk=keep.pk).delete()
+            ProductFacetSummary.objects.filter(pk=keep.pk).update(count=row["total"])
+
+
+def price_bucket_case():
+    """
+    SQL expression mapping Product.price to its PRICE_BUCKETS key.
+    """
+    whens = [
+        When(price__gte=low, price__lt=high, then=Value(key))
+        for key, (low, high) in PRICE_BUCKETS.items()
+    ]
+    whens.append(When(price=1000, then=Value("800_1000")))
+    return Case(*whens, default=Value(""), output_field=CharField())
+
+
+def rebuild_facet_summary():
+    """
+    Recompute every summary cell from the Product table in one GROUP BY
+    (one per partition database). Returns the number of cells written.
+    """
+    counts = Counter()
+    for alias in partition_aliases():
+        rows = (
+            Product.objects.using(alias)
+            .annotate(bucket=price_bucket_case())
+            .values_list("category_id", "brand_id", "status", "bucket")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for category_id, brand_id, status, bucket, count in rows:
+            counts[category_id, brand_id, status, bucket] += count
+    cells = [
+        ProductFacetSummary(
+            category_id=category_id,
+            brand_id=brand_id,
+            status=status,
+            price_bucket=bucket,
+            count=count,
+        )
+        for (category_id, brand_id, status, bucket), count in counts.items()
+    ]
+    with transaction.atomic():
+        ProductFacetSummary.objects.all().delete()
+        ProductFacetSummary.objects.bulk_create(cells, batch_size=500)
+    return len(cells)
+
+
+def summary_cells(category=None, brand=None, status=None, price_bucket=None):
+    """
+    Non-empty summary cells matching the given filters.
+    `category` and `brand` accept an id or a list of ids, `status` a value or a list.
+    """
+    cells = ProductFacetSummary.objects.filter(count__gt=0)
+    if category:
+        cells = cells.filter(category_id__in=category if isinstance(category, (list, tuple)) else [category])
+    if brand:
+        cells = cells.filter(brand_id__in=brand if isinstance(brand, (list, tuple)) else [brand])
+    if status:
+        cells = cells.filter(status__in=status if isinstance(status, (list, tuple)) else [status])
+    if price_bucket:
+        cells = cells.filter(price_bucket=price_bucket)
+    return cells
+
+
+def category_facets(cells):
+    return (
+        cells.values("category__id", "category__name")
+        .annotate(count=Sum("count"))
+        .order_by("-count")
+    )
+
+
+def brand_facets(cells):
+    return (
+        cells.values("brand__id", "brand__name")
+        .annotate(count=Sum("count"))
+        .order_by("-count")
+    )
+
+
+def status_facets(cells):
+    return cells.values("status").annotate(count=Sum("count")).order_by("status")
+
+
+def price_bucket_facets(cells):
+    """
+    Bucket counts keyed like the `p_0_50` aggregates used by the templates.
+    """
+    counts = {f"p_{key}": 0 for key in PRICE_BUCKETS}
+    for row in cells.values("price_bucket").annotate(count=Sum("count")).order_by():
+        if row["price_bucket"]:
+            counts[f"p_{row['price_bucket']}"] = row["count"]
+    return counts
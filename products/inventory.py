@@ -0,0 +1,192 @@
+# products/inventory.py
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DataError, IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils.crypto import constant_time_compare
+
+from .models import PendingStockDelta, Product
+from .optimizations import clear_list_cache
+from . import snapshot
+from .partitions import partition_aliases
+from .workers import in_worker
+
+logger = logging.getLogger(__name__)
+
+# Rows per UPDATE ... CASE statement
+BATCH_SIZE = 500
+# Queued deltas applied per drain transaction
+DRAIN_SIZE = 5000
+# Accepted product ids and deltas (BigAutoField / IntegerField ranges)
+MAX_PRODUCT_ID = 2 ** 63 - 1
+MAX_DELTA = 2 ** 31 - 1
+# Errors caused by the values in an update rather than the database being unavailable
+REJECTED_UPDATES = (DataError, IntegrityError, OverflowError)
+
+
+def invalidate_visibility():
+    """
+    A product appeared or disappeared (stock crossed zero): drop cached
+    list pages and flag the catalog snapshot, like a full save would.
+    """
+    clear_list_cache()
+    snapshot.mark_dirty()
+
+
+def adjust_stock(deltas):
+    """
+    Atomically add {product_id: delta} to Product.stock with one UPDATE
+    per BATCH_SIZE products (and partition), without loading or saving models.
+    Caches are only invalidated for products whose stock crossed zero.
+    Returns {product_id: new_stock} for the products that exist.
+    """
+    deltas = {int(pk): int(delta) for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    new_stock = {}
+    ids = sorted(deltas)  # consistent lock order between concurrent batches
+    for alias in partition_aliases():
+        products = Product.objects.using(alias)
+        with transaction.atomic(using=alias):
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch = ids[start:start + BATCH_SIZE]
+                products.filter(pk__in=batch).update(
+                    stock=F("stock") + Case(
+                        *[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                )
+                new_stock.update(products.filter(pk__in=batch).values_list("id", "stock"))
+
+    crossed = [pk for pk, stock in new_stock.items() if (stock - deltas[pk] > 0) != (stock > 0)]
+    if crossed:
+        invalidate_visibility()
+    return new_stock
+
+
+def has_inventory_token(request):
+    """
+    True for requests carrying "Authorization: Bearer <token>" with one of
+    PRODUCTS_INVENTORY_TOKENS (for producers without a browser session).
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    return any(constant_time_compare(token, known) for known in getattr(settings, "PRODUCTS_INVENTORY_TOKENS", ()))
+
+
+class StockUpdateQueue:
+    """
+    Queues stock deltas as PendingStockDelta rows, so a 202 survives a
+    restart, and writes them coalesced with adjust_stock() every
+    PRODUCTS_STOCK_FLUSH_INTERVAL seconds from a background thread.
+    With an interval of 0 nothing runs in the background; call drain().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, product_id, delta):
+        self.extend([(product_id, delta)])
+
+    def extend(self, adjustments):
+        """
+        Queue (product_id, delta) pairs with one INSERT.
+        """
+        PendingStockDelta.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+            PendingStockDelta(product_id=int(pk), delta=int(delta)) for pk, delta in adjustments if delta
+        )
+        self._ensure_worker()
+
+    def pending(self):
+        rows = (
+            PendingStockDelta.objects.using(DEFAULT_DB_ALIAS)
+            .filter(failed=False)
+            .values("product_id")
+            .annotate(total=Sum("delta"))
+            .order_by()
+        )
+        return {row["product_id"]: row["total"] for row in rows if row["total"]}
+
+    def drain(self):
+        """
+        Write everything queued so far; returns adjust_stock()'s result.
+        Rows are only deleted in the transaction that applied them, so a
+        batch that fails on a database error stays queued for the next drain.
+        A product whose own update is rejected (stock out of range) gets its
+        rows marked failed and left for inspection, so it can't block the queue.
+        """
+        queue = PendingStockDelta.objects.using(DEFAULT_DB_ALIAS)
+        new_stock = {}
+        while True:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                queued = list(
+                    queue.filter(failed=False)
+                    .select_for_update(skip_locked=True)  # other workers drain other rows
+                    .order_by("pk")
+                    .values_list("pk", "product_id", "delta")[:DRAIN_SIZE]
+                )
+                if not queued:
+                    return new_stock
+                deltas = Counter()
+                for _, product_id, delta in queued:
+                    deltas[product_id] += delta
+                try:
+                    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                        new_stock.update(adjust_stock(deltas))
+                    rejected = set()
+                except REJECTED_UPDATES:
+                    rejected = self._apply_each(deltas, new_stock)
+
+                pks = [pk for pk, product_id, _ in queued if product_id not in rejected]
+                for start in range(0, len(pks), BATCH_SIZE):
+                    queue.filter(pk__in=pks[start:start + BATCH_SIZE]).delete()
+                if rejected:
+                    failed = [pk for pk, product_id, _ in queued if product_id in rejected]
+                    queue.filter(pk__in=failed).update(failed=True)
+
+    def _apply_each(self, deltas, new_stock):
+        """
+        Apply a rejected batch one product at a time; returns the products
+        whose update was rejected on its own.
+        """
+        rejected = set()
+        for product_id, delta in deltas.items():
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    new_stock.update(adjust_stock({product_id: delta}))
+            except REJECTED_UPDATES:
+                logger.exception("Stock update for product %s rejected, marking its queued deltas failed", product_id)
+                rejected.add(product_id)
+        return rejected
+
+    def _ensure_worker(self):
+        interval = getattr(settings, "PRODUCTS_STOCK_FLUSH_INTERVAL", 0)
+        if interval <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(interval,), name="products-stock", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                in_worker(self.drain)
+            except Exception:
+                logger.exception("Stock update batch failed, will retry")
+
+
+stock_queue = StockUpdateQueue()
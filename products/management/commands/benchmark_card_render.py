@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.template.loader import render_to_string
+from products.cards import compiled_cards
+from products.engine import FilterEngine
+
+class Command(BaseCommand):
+    help = "Compare render time per product card: Django template vs compiled fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500, help="Renders per path")
+        parser.add_argument("--template", default="products/partials/multi_tags_list.html", help="Card partial to render")
+        parser.add_argument("--per-page", type=int, default=32, help="Products per page")
+
+    def handle(self, *args, **kwargs):
+        template_name = kwargs["template"]
+        compiled = compiled_cards(template_name)
+        if compiled is None:
+            self.stdout.write(self.style.WARNING(f"{template_name} can't be compiled, nothing to compare"))
+            return
+
+        # Fetch once so only rendering is timed
+        products = list(FilterEngine(QueryDict(""), per_page=kwargs["per_page"]).page)
+        cards = max(len(products), 1) * kwargs["iterations"]
+
+        django_html = render_to_string(template_name, {"products": products})
+        if compiled.render(products) != django_html:
+            self.stdout.write(self.style.ERROR("Compiled output differs from the Django template"))
+            return
+
+        results = {}
+        for label, render in (
+            ("django", lambda: render_to_string(template_name, {"products": products})),
+            ("fast", lambda: compiled.render(products)),
+        ):
+            start = time.perf_counter()
+            for _ in range(kwargs["iterations"]):
+                render()
+            results[label] = (time.perf_counter() - start) / cards * 1_000_000
+            self.stdout.write(f"{label:>6}: {results[label]:.2f} µs/card")
+
+        self.stdout.write(self.style.SUCCESS(f"Byte-identical output, {results['django'] / results['fast']:.1f}x faster"))
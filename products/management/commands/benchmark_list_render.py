@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.template.loader import render_to_string
+from products.engine import FilterEngine
+
+class Command(BaseCommand):
+    help = "Compare per-page fetch + render time of lean rows against ORM model instances"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="Pages rendered per path")
+        parser.add_argument("--query", default="", help="Filter query string, e.g. 'status=active&page=2'")
+        parser.add_argument("--per-page", type=int, default=32, help="Products per page")
+
+    def handle(self, *args, **kwargs):
+        params = QueryDict(kwargs["query"])
+        results = {}
+        for label, lean in (("orm", False), ("lean", True)):
+            # Warm the name lookups and template cache before timing
+            self.render_page(params, kwargs["per_page"], lean)
+            start = time.perf_counter()
+            for _ in range(kwargs["iterations"]):
+                self.render_page(params, kwargs["per_page"], lean)
+            results[label] = (time.perf_counter() - start) / kwargs["iterations"] * 1000
+            self.stdout.write(f"{label:>5}: {results[label]:.3f} ms/page")
+
+        self.stdout.write(self.style.SUCCESS(f"lean rows are {results['orm'] / results['lean']:.2f}x faster than the ORM path"))
+
+    def render_page(self, params, per_page, lean):
+        page = FilterEngine(params, per_page=per_page, lean=lean).page
+        return render_to_string("products/partials/multi_tags_list.html", {"products": page})
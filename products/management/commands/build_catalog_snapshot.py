@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products.snapshot import build_snapshot, is_dirty, snapshot_path
+
+class Command(BaseCommand):
+    help = "Write the memory-mapped columnar snapshot of Product's filterable fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Snapshot file (defaults to PRODUCTS_SNAPSHOT_PATH)")
+        parser.add_argument("--watch", action="store_true", help="Keep running and rebuild after product changes")
+        parser.add_argument("--interval", type=float, default=10.0, help="Seconds between change checks")
+
+    def handle(self, *args, **kwargs):
+        self.build(kwargs["path"])
+        while kwargs["watch"]:
+            time.sleep(kwargs["interval"])
+            if is_dirty():
+                self.build(kwargs["path"])
+
+    def build(self, path):
+        start = time.perf_counter()
+        count = build_snapshot(path)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} products written to {path or snapshot_path()} in {elapsed:.2f}s"
+        ))
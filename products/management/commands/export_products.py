@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from products.engine import FilterEngine
+from products.exports import EXPORT_FORMATS, iter_export_rows
+
+class Command(BaseCommand):
+    help = "Export the products matching a filter as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", default="csv", choices=sorted(EXPORT_FORMATS), help="Output format")
+        parser.add_argument("--query", default="", help="Filter query string, e.g. 'category=1&status=active'")
+        parser.add_argument("--output", help="File to write to (defaults to stdout)")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per keyset chunk")
+
+    def handle(self, *args, **kwargs):
+        encode = EXPORT_FORMATS[kwargs["format"]][0]
+        engine = FilterEngine(QueryDict(kwargs["query"]))
+        rows = iter_export_rows(engine.queryset, chunk_size=kwargs["chunk_size"], aliases=engine.partitions)
+
+        if kwargs["output"]:
+            try:
+                out = open(kwargs["output"], "w", encoding="utf-8", newline="")
+            except OSError as exc:
+                raise CommandError(f"Cannot write {kwargs['output']}: {exc}")
+            with out:
+                out.writelines(encode(rows))
+            self.stderr.write(self.style.SUCCESS(f"Products exported to {kwargs['output']}"))
+        else:
+            self.stdout.ending = ""
+            for chunk in encode(rows):
+                self.stdout.write(chunk)
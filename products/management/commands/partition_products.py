@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products.facets import rebuild_facet_summary
+from products.optimizations import clear_list_cache
+from products.partitions import allocate_ids, is_partitioned, mirror_lookup_tables, rebalance_partitions
+from products.snapshot import mark_dirty
+
+class Command(BaseCommand):
+    help = "Move products into the databases their categories are assigned to in PRODUCTS_PARTITIONS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Products moved per batch")
+
+    def handle(self, *args, **kwargs):
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING("PRODUCTS_PARTITIONS is empty, nothing to do"))
+            return
+        mirror_lookup_tables()
+        allocate_ids(0)  # seed the id sequence past every existing product
+        moved = rebalance_partitions(kwargs["batch_size"])
+        rebuild_facet_summary()
+        clear_list_cache()
+        mark_dirty()
+        self.stdout.write(self.style.SUCCESS(f"{moved} products moved to their partitions!"))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from products.facets import rebuild_facet_summary
+
+class Command(BaseCommand):
+    help = "Rebuild the ProductFacetSummary table from the Product table"
+
+    def handle(self, *args, **kwargs):
+        cells = rebuild_facet_summary()
+        self.stdout.write(self.style.SUCCESS(f"{cells} facet cells rebuilt successfully!"))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from products.warming import (
+    WARM_VIEWS,
+    combinations_from_facets,
+    combinations_from_log,
+    needs_rewarm,
+    warm_combinations,
+)
+
+class Command(BaseCommand):
+    help = "Pre-render the most popular clear_dynamic / multi_tags filter pages into the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=50, help="Number of filter combinations to warm")
+        parser.add_argument("--pages", type=int, default=1, help="Pages to warm per facet-derived combination")
+        parser.add_argument("--concurrency", type=int, default=4, help="Maximum pages rendered at once")
+        parser.add_argument("--log", help="Traffic log to derive popular combinations from")
+        parser.add_argument(
+            "--view", action="append", choices=list(WARM_VIEWS), dest="views",
+            help="Page to warm (repeatable, defaults to every cached list page)",
+        )
+        parser.add_argument("--watch", action="store_true", help="Keep running and re-warm after invalidations")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between invalidation checks")
+
+    def handle(self, *args, **kwargs):
+        self.warm(kwargs)
+        while kwargs["watch"]:
+            time.sleep(kwargs["interval"])
+            if needs_rewarm():
+                self.warm(kwargs)
+
+    def warm(self, options):
+        view_names = options["views"] or list(WARM_VIEWS)
+        if options["log"]:
+            # Each page warms its own most requested combinations
+            warmed = 0
+            for view_name in view_names:
+                with open(options["log"], encoding="utf-8") as fh:
+                    combos = combinations_from_log(fh, path=reverse(view_name), top=options["top"])
+                warmed += warm_combinations(combos, concurrency=options["concurrency"], view_names=[view_name])
+        else:
+            combos = combinations_from_facets(top=options["top"], pages=options["pages"])
+            warmed = warm_combinations(combos, concurrency=options["concurrency"], view_names=view_names)
+        self.stdout.write(self.style.SUCCESS(f"{warmed} cached pages warmed successfully!"))
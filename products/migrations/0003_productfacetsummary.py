@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_products_pr_categor_1e5c3d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive')], max_length=10)),
+                ('price_bucket', models.CharField(blank=True, max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('brand', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='facet_cells', to='products.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_cells', to='products.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'brand', 'status', 'price_bucket'), name='unique_facet_cell')],
+            },
+        ),
+    ]
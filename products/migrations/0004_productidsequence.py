@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_productfacetsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_id', models.BigIntegerField()),
+            ],
+        ),
+    ]
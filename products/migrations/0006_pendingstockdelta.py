@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_name_lower_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingStockDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('delta', models.IntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_pendingstockdelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingstockdelta',
+            name='failed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
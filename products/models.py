@@ -1,4 +1,31 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Lower
+
+# Price buckets shared by the facet sidebars (lower bound inclusive)
+PRICE_BUCKETS = {
+    "0_50": (0, 50),
+    "50_100": (50, 100),
+    "100_200": (100, 200),
+    "200_500": (200, 500),
+    "500_800": (500, 800),
+    "800_1000": (800, 1000),
+}
+
+
+def price_bucket_for(price):
+    """
+    Return the PRICE_BUCKETS key a price falls into, or "" if out of range.
+    The last bucket includes its upper bound, like the facet aggregate.
+    """
+    price = Decimal(str(price))
+    for key, (low, high) in PRICE_BUCKETS.items():
+        if low <= price < high:
+            return key
+    if price == 1000:
+        return "800_1000"
+    return ""
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -15,6 +42,19 @@ class Brand(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        """
+        Like QuerySet.create(), but without an explicit using() the new row
+        goes where the routers send it (its category's partition, see products.partitions).
+        """
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
 class Product(models.Model):
     STATUS_CHOICES = (("active","Active"),("inactive","Inactive"))
 
@@ -26,13 +66,67 @@ class Product(models.Model):
     stock = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["category", "brand"]),
             models.Index(fields=["category", "status"]),
             models.Index(fields=["-created_at"]),
             models.Index(fields=["price", "status"]),
+            # Case-insensitive name prefix search in the admin
+            models.Index(Lower("name"), name="product_name_lower_idx"),
         ]
 
     def __str__(self):
         return self.name
+
+
+class ProductFacetSummary(models.Model):
+    """
+    Materialized product counts per (category, brand, status, price bucket) cell.
+    Kept up to date by signals, rebuilt with `manage.py rebuild_facet_summary`
+    (needed after bulk_create() or QuerySet.update(), which send no signals).
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="facet_cells")
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, related_name="facet_cells")
+    status = models.CharField(max_length=10, choices=Product.STATUS_CHOICES)
+    price_bucket = models.CharField(max_length=20, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "brand", "status", "price_bucket"],
+                name="unique_facet_cell",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id}/{self.brand_id}/{self.status}/{self.price_bucket}: {self.count}"
+
+
+class ProductIdSequence(models.Model):
+    """
+    Next free product id while products are partitioned across databases
+    (PRODUCTS_PARTITIONS), so ids stay unique over every partition.
+    """
+    next_id = models.BigIntegerField()
+
+    def __str__(self):
+        return str(self.next_id)
+
+
+class PendingStockDelta(models.Model):
+    """
+    A queued stock change, written before the inventory endpoint answers 202
+    and removed once the stock worker has applied it (products/inventory.py).
+    Kept in the default database; product_id may point into any partition.
+    """
+    product_id = models.BigIntegerField()
+    delta = models.IntegerField()
+    failed = models.BooleanField(default=False)  # rejected by the stock update, kept for inspection
+
+    def __str__(self):
+        return f"{self.product_id}: {self.delta:+d}"
+
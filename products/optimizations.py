@@ -1,8 +1,29 @@
 # products/optimizations.py
+import gzip
 import hashlib
-from urllib.parse import urlencode
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from django.conf import settings
 from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+
+from .cards import render_card_list
+from .models import Product, PRICE_BUCKETS
+from .workers import in_worker
+
+# Seconds a rendered list page stays cached
+LIST_CACHE_TTL = 60 * 5
+
+# Background renders for speculative prefetching, started on first use
+_prefetch_pool = None
+# Prefetch batches queued or running at once; more are dropped, not queued
+PREFETCH_MAX_PENDING = 4
+_prefetch_slots = threading.BoundedSemaphore(PREFETCH_MAX_PENDING)
 
 def cache_key_for_request(prefix: str, get_items):
     """
@@ -12,20 +33,231 @@ def cache_key_for_request(prefix: str, get_items):
     _s = urlencode(sorted(get_items))
     return f"{prefix}:{hashlib.md5(_s.encode()).hexdigest()}"
 
-def cache_products_response(request, products_page, active_filters):
+def clear_list_cache():
     """
-    Cache the rendered products HTML & active filters for a filter request.
+    Drop every cached product list payload.
+    """
+    try:
+        # Delete all keys starting with "products:list:"
+        cache.delete_pattern("products:list*")
+    except AttributeError:
+        # fallback if backend doesn't support delete_pattern
+        cache.clear()
+
+def request_cache_key(request, prefix):
+    # lists() keeps every value of multi-select params like ?category=1&category=2
+    get_items = [(k, v) for k, values in request.GET.lists() for v in values]
+    return cache_key_for_request(prefix, get_items)
+
+class CacheEntry:
+    """
+    A cached list payload: the gzipped body, ready to send as-is, plus
+    per-card HTML (gzipped too) and tag keys for diff responses.
+    A plain object with a readable __str__, so tools that print cached
+    values (the debug toolbar's cache panel) don't choke on the bytes.
+    """
+    __slots__ = ("gzip", "cards", "tags", "tags_html", "prefetch")
+
+    def __init__(self, gzip, cards, tags, tags_html, prefetch):
+        self.gzip = gzip
+        self.cards = cards
+        self.tags = tags
+        self.tags_html = tags_html
+        self.prefetch = prefetch
+
+    def __str__(self):
+        return f"<CacheEntry: {len(self.gzip)} gzip bytes, cards={self.cards is not None}, tags={self.tags}>"
+
+def make_entry(payload, cards=(), tags=()):
+    """
+    CacheEntry for a JSON payload.
+    Leave `cards` empty for views whose clients never ask for diffs.
+    """
+    body = json.dumps(payload, cls=DjangoJSONEncoder).encode()
+    cards = list(cards)
+    return CacheEntry(
+        gzip=gzip.compress(body, compresslevel=6),
+        cards=gzip.compress(json.dumps(cards).encode(), compresslevel=6) if cards else None,
+        tags=list(tags),
+        tags_html=payload.get("tags_html"),
+        prefetch=payload.get("prefetch", []),
+    )
+
+def entry_payload(entry):
+    return json.loads(gzip.decompress(entry.gzip))
+
+def entry_cards(entry):
     """
-    key = cache_key_for_request("products:list", request.GET.items())
-    cached = cache.get(key)
-    if cached:
-        return cached  # Cache hit
+    [(product id, card html)] stored with an entry.
+    """
+    return json.loads(gzip.decompress(entry.cards)) if entry.cards else []
+
+def cached_entry(request, prefix, render):
+    """
+    Return the cached entry for this request, calling render() on a miss.
+    Requests flagged with `refresh_cache` (cache warming) always re-render,
+    so the stored entry gets a fresh TTL.
+    """
+    key = request_cache_key(request, prefix)
+    if not getattr(request, "refresh_cache", False):
+        cached = cache.get(key)
+        if cached:
+            return cached  # Cache hit
 
     # Cache miss — render and store
-    products_html = render_to_string("products/partials/multi_tags_list.html", {"products": products_page})
-    tags_html = render_to_string("products/partials/active_filters.html", {"active_filters": active_filters})
-    payload = {"html": products_html, "tags_html": tags_html}
+    entry = render()
+    cache.set(key, entry, timeout=LIST_CACHE_TTL)
+    return entry
+
+def accepts_gzip(request):
+    return "gzip" in request.headers.get("Accept-Encoding", "")
 
-    # Save in Redis for 60 seconds
-    cache.set(key, payload, timeout=60 * 5)  # 5 min TTL
-    return payload
+def entry_response(request, entry):
+    """
+    JSON response for a cache entry.
+
+    - Clients sending X-Known-Cards get a diff against what they show.
+    - gzip-capable clients get the stored compressed body untouched.
+    - Everyone else gets it decompressed.
+    """
+    if "X-Known-Cards" in request.headers:
+        response = JsonResponse(entry_diff(request, entry))
+        patch_vary_headers(response, ("X-Known-Cards", "X-Known-Tags"))
+        return response
+
+    if accepts_gzip(request):
+        response = HttpResponse(entry.gzip, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(entry.gzip), content_type="application/json")
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+def entry_diff(request, entry):
+    """
+    Only what changed relative to the client's previous state:
+    X-Known-Cards lists the product ids it shows, X-Known-Tags its tag keys.
+    """
+    known_cards = set(filter(None, request.headers.get("X-Known-Cards", "").split(",")))
+    known_tags = request.headers.get("X-Known-Tags", "").split(",")
+    cards = entry_cards(entry)
+    diff = {
+        "cards": {
+            "order": [pk for pk, _ in cards],
+            "html": {pk: html for pk, html in cards if str(pk) not in known_cards},
+        },
+        "prefetch": entry.prefetch,
+    }
+    if not cards:
+        # Nothing to assemble: send the "no products" markup as-is
+        diff["html"] = entry_payload(entry)["html"]
+    if entry.tags_html is not None:
+        diff["tags"] = {"keys": entry.tags}
+        if [tag for tag in known_tags if tag] != entry.tags:
+            diff["tags"]["html"] = entry.tags_html
+    return diff
+
+def active_filter_keys(active_filters):
+    """
+    Stable "filter:value" keys for the active filter tags.
+    """
+    keys = [f"category:{c.id}" for c in active_filters["category"]]
+    keys += [f"status:{s[0]}" for s in active_filters["status"]]
+    keys += [f"brand:{b.id}" for b in active_filters["brand"]]
+    if active_filters["price_bucket"]:
+        keys.append(f"price_bucket:{active_filters['price_bucket']}")
+    return keys
+
+def cache_products_response(request, products_page, active_filters, hints=(), prefix="products:list"):
+    """
+    Cache the rendered products HTML & active filters for a filter request.
+    Returns the cache entry; send it with entry_response().
+    """
+    template_name = "products/partials/multi_tags_list.html"
+
+    def render():
+        products_html, cards = render_card_list(template_name, products_page)
+        tags_html = render_to_string("products/partials/active_filters.html", {"active_filters": active_filters})
+        return make_entry(
+            {"html": products_html, "tags_html": tags_html, "prefetch": list(hints)},
+            cards=cards,
+            tags=active_filter_keys(active_filters),
+        )
+
+    return cached_entry(request, prefix, render)
+
+def prefetch_urls(request, page_obj):
+    """
+    URLs the user is likely to request next: page N+1 and, if
+    PRODUCTS_PREFETCH_NEIGHBORS is on, the one-click status/price toggles.
+    """
+    urls = []
+    if page_obj.has_next():
+        params = request.GET.copy()
+        params["page"] = page_obj.next_page_number()
+        urls.append(params)
+
+    if getattr(settings, "PRODUCTS_PREFETCH_NEIGHBORS", False):
+        for value, _ in Product.STATUS_CHOICES:
+            params = request.GET.copy()
+            params.pop("page", None)
+            statuses = params.getlist("status")
+            params.setlist("status", [s for s in statuses if s != value] if value in statuses else statuses + [value])
+            urls.append(params)
+        for bucket in PRICE_BUCKETS:
+            params = request.GET.copy()
+            params.pop("page", None)
+            if params.get("price_bucket") == bucket:
+                params.pop("price_bucket")
+            else:
+                params["price_bucket"] = bucket
+            urls.append(params)
+
+    return [f"{request.path}?{urlencode(sorted((k, v) for k, vs in p.lists() for v in vs))}" for p in urls]
+
+def is_prefetch(request):
+    purpose = request.headers.get("Sec-Purpose") or request.headers.get("Purpose") or ""
+    return "prefetch" in purpose
+
+def prefetch_now(view, urls):
+    """
+    Render each URL through `view` as an AJAX prefetch so its payload is cached.
+    """
+    from django.test import RequestFactory  # pulls in the test client, keep it off the import path
+
+    factory = RequestFactory()
+    for url in urls:
+        view(factory.get(url, HTTP_X_REQUESTED_WITH="XMLHttpRequest", HTTP_PURPOSE="prefetch"))
+
+def _prefetch_in_worker(view, urls):
+    try:
+        in_worker(prefetch_now, view, urls)
+    finally:
+        _prefetch_slots.release()
+
+def url_cache_key(prefix, url):
+    return cache_key_for_request(prefix, parse_qsl(urlsplit(url).query, keep_blank_values=True))
+
+def schedule_prefetch(view, request, urls, prefix):
+    """
+    Render the hinted URLs that aren't cached under `prefix` yet in the
+    background. Prefetch requests never schedule further prefetches, and
+    batches are dropped while PREFETCH_MAX_PENDING are already in flight.
+    """
+    global _prefetch_pool
+    if not urls or not getattr(settings, "PRODUCTS_PREFETCH", False) or is_prefetch(request):
+        return
+    urls = [url for url in urls if cache.get(url_cache_key(prefix, url)) is None]
+    if not urls or not _prefetch_slots.acquire(blocking=False):
+        return
+    if _prefetch_pool is None:
+        _prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="products-prefetch")
+    _prefetch_pool.submit(_prefetch_in_worker, view, urls)
+
+def add_prefetch_links(response, urls):
+    """
+    Let browsers prefetch the next full pages on non-AJAX responses.
+    """
+    if urls:
+        response["Link"] = ", ".join(f"<{url}>; rel=prefetch" for url in urls)
+    return response
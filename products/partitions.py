@@ -0,0 +1,257 @@
+# products/partitions.py
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, DateTimeField, F, Max, Value, When
+
+from .models import Brand, Category, Product, ProductIdSequence
+from .rows import ProductRow
+from .workers import in_worker
+
+# Models stored in every partition database (products join categories and brands there)
+PARTITIONED_MODELS = {"category", "brand", "product"}
+
+_pool = None
+
+
+# -- Partition map --
+def partition_settings():
+    """
+    PRODUCTS_PARTITIONS: {database alias: [category ids stored there]}.
+    Categories not listed stay in the default database.
+    """
+    return getattr(settings, "PRODUCTS_PARTITIONS", None) or {}
+
+
+def is_partitioned():
+    return bool(partition_settings())
+
+
+def partition_databases():
+    """
+    Partition aliases other than the default database.
+    """
+    return [alias for alias in partition_settings() if alias != DEFAULT_DB_ALIAS]
+
+
+def partition_aliases():
+    """
+    Every database that may hold products, default first.
+    """
+    return [DEFAULT_DB_ALIAS, *partition_databases()]
+
+
+def alias_for_category(category_id):
+    for alias, category_ids in partition_settings().items():
+        if category_id in category_ids:
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def aliases_for_categories(category_ids):
+    """
+    Databases holding products of the given categories, in partition_aliases() order.
+    """
+    wanted = {alias_for_category(pk) for pk in category_ids}
+    return [alias for alias in partition_aliases() if alias in wanted]
+
+
+class PartitionRouter:
+    """
+    Routes Product writes (and reads with an instance hint) to the database
+    of the product's category. Every other query uses the default routing,
+    so list reads go through FilterEngine.partitions / PartitionedRows.
+    """
+
+    def _product_alias(self, model, hints):
+        instance = hints.get("instance")
+        if (
+            model._meta.label_lower == "products.product"
+            and isinstance(instance, model)
+            and instance.category_id is not None
+            and is_partitioned()
+        ):
+            return alias_for_category(instance.category_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._product_alias(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._product_alias(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Categories and brands are mirrored into every partition
+        if obj1._meta.app_label == obj2._meta.app_label == "products":
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in partition_databases():
+            return app_label == "products" and model_name in PARTITIONED_MODELS
+        return None
+
+
+# -- Ids --
+def allocate_ids(count=1):
+    """
+    Reserve `count` consecutive product ids from the sequence in the default
+    database, seeding it past the highest id in any partition on first use.
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        sequence = ProductIdSequence.objects.select_for_update().first()
+        if sequence is None:
+            highest = [
+                Product.objects.using(alias).aggregate(top=Max("id"))["top"] or 0
+                for alias in partition_aliases()
+            ]
+            sequence = ProductIdSequence.objects.create(next_id=max(highest) + 1)
+        ProductIdSequence.objects.filter(pk=sequence.pk).update(next_id=F("next_id") + count)
+    return range(sequence.next_id, sequence.next_id + count)
+
+
+# -- Mirrored lookup tables --
+def mirror_rows(model, objs):
+    """
+    Insert or update copies of Category/Brand rows in every partition database.
+    """
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    for alias in partition_databases():
+        # Copies, because bulk_create() rebinds instances to the database it wrote to
+        copies = [model(pk=obj.pk, **{f.attname: getattr(obj, f.attname) for f in fields}) for obj in objs]
+        model.objects.using(alias).bulk_create(
+            copies,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[f.name for f in fields],
+        )
+
+
+def unmirror_rows(model, pks):
+    for alias in partition_databases():
+        model.objects.using(alias).filter(pk__in=pks).delete()
+
+
+def mirror_lookup_tables():
+    mirror_rows(Category, list(Category.objects.using(DEFAULT_DB_ALIAS)))
+    mirror_rows(Brand, list(Brand.objects.using(DEFAULT_DB_ALIAS)))
+
+
+def misplaced_products(alias):
+    """
+    Products stored in `alias` whose category belongs to another database.
+    """
+    products = Product.objects.using(alias)
+    if alias == DEFAULT_DB_ALIAS:
+        listed = [pk for category_ids in partition_settings().values() for pk in category_ids]
+        return products.filter(category_id__in=listed)
+    return products.exclude(category_id__in=partition_settings()[alias])
+
+
+def rebalance_partitions(batch_size=1000):
+    """
+    Move every product into its category's database, one batch at a time.
+    Copies are bulk inserted without signals, while deleting the originals
+    counts them out of the facet summary, so rebuild it afterwards.
+    Returns the number of products moved.
+    """
+    moved = 0
+    for source in partition_aliases():
+        while True:
+            batch = list(misplaced_products(source).order_by("pk")[:batch_size])
+            if not batch:
+                break
+            by_target = {}
+            for product in batch:
+                by_target.setdefault(alias_for_category(product.category_id), []).append(product)
+            for target, products in by_target.items():
+                created = {product.pk: product.created_at for product in products}
+                with transaction.atomic(using=target):
+                    # Conflicts are rows copied by an interrupted earlier run
+                    Product.objects.using(target).bulk_create(products, ignore_conflicts=True)
+                    # bulk_create() stamps auto_now_add fields; keep the original dates
+                    Product.objects.using(target).filter(pk__in=created).update(
+                        created_at=Case(
+                            *[When(pk=pk, then=Value(value)) for pk, value in created.items()],
+                            output_field=DateTimeField(),
+                        )
+                    )
+            Product.objects.using(source).filter(pk__in=[p.pk for p in batch]).delete()
+            moved += len(batch)
+    return moved
+
+
+# -- Fan-out reads --
+def fan_out(func, aliases):
+    """
+    Call func(alias) for every alias, on PRODUCTS_PARTITION_WORKERS threads
+    when there is more than one. Results come back in alias order.
+    """
+    global _pool
+    workers = getattr(settings, "PRODUCTS_PARTITION_WORKERS", 4)
+    if workers <= 0 or len(aliases) < 2:
+        return [func(alias) for alias in aliases]
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="products-partition")
+    return list(_pool.map(in_worker, repeat(func), aliases))
+
+
+class PartitionedRows:
+    """
+    Paginator-friendly view of one queryset over several partitions.
+    Counts are summed; a page slice takes the first `stop` rows of every
+    partition and merges them by the queryset's ordering.
+    """
+    ordered = True
+
+    def __init__(self, queryset, aliases, lean=True):
+        self.queryset = queryset
+        self.aliases = list(aliases)
+        self.lean = lean
+
+        ordering = [str(field) for field in queryset.query.order_by] or ["-id"]
+        directions = {field.startswith("-") for field in ordering}
+        if len(directions) != 1:
+            raise ValueError("Partitioned rows need an ordering in one direction")
+        self.descending = directions.pop()
+        self.sort_fields = [field.lstrip("-") for field in ordering]
+        if "id" not in self.sort_fields:
+            # Tie-break on id so every partition and the merge agree
+            self.sort_fields.append("id")
+        self.ordering = [("-" if self.descending else "") + field for field in self.sort_fields]
+
+    def count(self):
+        return sum(fan_out(lambda alias: self.queryset.using(alias).count(), self.aliases))
+
+    def __len__(self):
+        return self.count()
+
+    def _fetch(self, alias, stop):
+        queryset = self.queryset.using(alias).order_by(*self.ordering)
+        if self.lean:
+            return list(queryset.values_list(*ProductRow.fields, *self.sort_fields)[:stop])
+        fields, deferred = queryset.query.deferred_loading
+        if fields and not deferred:
+            # only() querysets: load the merge keys too
+            queryset = queryset.only(*fields, *self.sort_fields)
+        return list(queryset[:stop])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        chunks = fan_out(lambda alias: self._fetch(alias, stop), self.aliases)
+        if self.lean:
+            width = len(ProductRow.fields)
+            key = lambda row: row[width:]  # noqa: E731
+        else:
+            key = attrgetter(*self.sort_fields)
+        merged = heapq.merge(*chunks, key=key, reverse=self.descending)
+        rows = list(islice(merged, start, stop))
+        if self.lean:
+            return [ProductRow.from_values(row[:width]) for row in rows]
+        return rows
@@ -0,0 +1,131 @@
+# products/rows.py
+import time
+
+from .models import Brand, Category
+
+# Seconds an in-process name lookup is trusted before reloading
+LOOKUP_TTL = 60
+
+
+class NameRef:
+    """
+    Stand-in for a Category/Brand on list pages: just id and name.
+    """
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class ProductRow:
+    """
+    Lightweight product card row built from a values_list() tuple.
+    """
+    __slots__ = ("id", "name", "price", "status", "category", "brand")
+
+    # Columns fetched for each row, in constructor order
+    fields = ("id", "name", "price", "status", "category_id", "brand_id")
+
+    def __init__(self, id, name, price, status, category, brand):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.status = status
+        self.category = category
+        self.brand = brand
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Build a row from a ProductRow.fields tuple, resolving the related names.
+        """
+        pk, name, price, status, category_id, brand_id = values
+        return cls(pk, name, price, status, category_names.get(category_id), brand_names.get(brand_id))
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class NameLookup:
+    """
+    In-process id -> NameRef map for a small lookup table.
+    Reloaded after LOOKUP_TTL, on an unknown id, or when cleared by signals.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+
+    def clear(self):
+        self._by_id = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        self._by_id = {pk: NameRef(pk, name) for pk, name in self.model.objects.order_by("id").values_list("id", "name")}
+        self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        if self._by_id is None or time.monotonic() - self._loaded_at > LOOKUP_TTL:
+            self._load()
+        return self._by_id
+
+    def get(self, pk):
+        if pk is None:
+            return None
+        ref = self._fresh().get(pk)
+        if ref is None:
+            self._load()
+            ref = self._by_id.get(pk)
+        return ref
+
+    def all(self):
+        return list(self._fresh().values())
+
+    def filter(self, ids=(), names=()):
+        """
+        NameRefs matching any of the ids or names, in table order.
+        """
+        ids, names = set(ids), set(names)
+        if not ids and not names:
+            return []
+        return [ref for ref in self._fresh().values() if ref.id in ids or ref.name in names]
+
+
+category_names = NameLookup(Category)
+brand_names = NameLookup(Brand)
+
+
+class ProductRows:
+    """
+    Paginator-friendly wrapper over a filtered Product queryset that
+    slices into ProductRow objects instead of model instances.
+    """
+    ordered = True
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        rows = self.queryset.values_list(*ProductRow.fields)[index]
+        if not isinstance(index, slice):
+            rows = [rows]
+        result = [ProductRow.from_values(values) for values in rows]
+        return result if isinstance(index, slice) else result[0]
@@ -1,16 +1,125 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import DEFAULT_DB_ALIAS
 from django.dispatch import receiver
-from django.core.cache import cache
-from .models import Product
+from .models import Brand, Category, Product
+from .facets import bump_cell, facet_cell, merge_unbranded_cells
+from .optimizations import clear_list_cache
+from .rows import brand_names, category_names
+from . import partitions, snapshot
+
+FACET_FIELDS = {"category", "category_id", "brand", "brand_id", "status", "price"}
+LIST_FIELDS = FACET_FIELDS | {"name"}
 
 @receiver([post_save, post_delete], sender=Product)
-def clear_products_cache(sender, instance, **kwargs):
+def clear_products_cache(sender, instance, update_fields=None, **kwargs):
     """
     Invalidate all product list caches when a product is added/updated/deleted.
+    Saves limited to fields no list page shows (e.g. update_fields=["stock"]) are skipped;
+    stock changes go through products.inventory, which invalidates on zero crossings.
+    """
+    if update_fields is not None and not LIST_FIELDS.intersection(update_fields):
+        return
+    clear_list_cache()
+
+@receiver(pre_save, sender=Product)
+def prepare_partitioned_save(sender, instance, using, raw=False, **kwargs):
+    """
+    With PRODUCTS_PARTITIONS set, give new products an id that is unique
+    over every partition, and notice products whose category moved them.
+    Connected before remember_facet_cell: a moved product counts as a new row.
+    """
+    instance._moved_from = None
+    if raw or not partitions.is_partitioned():
+        return
+    if instance.pk is None:
+        instance.pk = partitions.allocate_ids()[0]
+    elif not instance._state.adding and instance._state.db not in (None, using):
+        instance._moved_from = instance._state.db
+
+@receiver(pre_save, sender=Product)
+def remember_facet_cell(sender, instance, using, update_fields=None, **kwargs):
+    """
+    Remember which summary cell the stored row was in before it changes.
+    """
+    instance._previous_facet_cell = None
+    if instance.pk is None or getattr(instance, "_moved_from", None):
+        return
+    if update_fields is not None and not FACET_FIELDS.intersection(update_fields):
+        return
+    previous = (
+        Product.objects.using(instance._state.db or using)
+        .only("category", "brand", "status", "price")
+        .filter(pk=instance.pk)
+        .first()
+    )
+    if previous is not None:
+        instance._previous_facet_cell = facet_cell(previous)
+
+@receiver(post_save, sender=Product)
+def remove_moved_product(sender, instance, **kwargs):
+    """
+    Delete the copy left in the old partition (its cell is decremented on delete).
+    """
+    if getattr(instance, "_moved_from", None):
+        Product.objects.using(instance._moved_from).filter(pk=instance.pk).delete()
+        instance._moved_from = None
+
+@receiver(post_save, sender=Product)
+def update_facet_summary(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Move the product's count from its old summary cell to the new one.
+    """
+    if update_fields is not None and not FACET_FIELDS.intersection(update_fields):
+        return
+    previous = getattr(instance, "_previous_facet_cell", None)
+    current = facet_cell(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        bump_cell(previous, -1)
+    bump_cell(current, 1)
+
+@receiver(post_delete, sender=Product)
+def remove_from_facet_summary(sender, instance, **kwargs):
+    bump_cell(facet_cell(instance), -1)
+
+@receiver([post_save, post_delete], sender=Product)
+def mark_snapshot_dirty(sender, update_fields=None, **kwargs):
+    """
+    Flag the columnar catalog snapshot for the next rebuild.
+    """
+    if update_fields is not None and not FACET_FIELDS.intersection(update_fields):
+        return
+    snapshot.mark_dirty()
+
+@receiver(post_delete, sender=Brand)
+def merge_brand_cells(sender, using, **kwargs):
+    """
+    The deleted brand's summary cells are now brand-less; merge them with the existing ones.
     """
-    try:
-        # Delete all keys starting with "products:list:"
-        cache.delete_pattern("products:list*")
-    except AttributeError:
-        # fallback if backend doesn't support delete_pattern
-        cache.clear()
\ No newline at end of file
+    if using == DEFAULT_DB_ALIAS:
+        merge_unbranded_cells()
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+def clear_name_lookups(sender, **kwargs):
+    """
+    Drop this process's cached category/brand names for lean list rows.
+    """
+    category_names.clear()
+    brand_names.clear()
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def mirror_partition_lookups(sender, instance, using, **kwargs):
+    """
+    Copy categories and brands saved in the default database into every partition.
+    """
+    if using == DEFAULT_DB_ALIAS and partitions.is_partitioned():
+        partitions.mirror_rows(sender, [instance])
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+def unmirror_partition_lookups(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and partitions.is_partitioned():
+        partitions.unmirror_rows(sender, [instance.pk])
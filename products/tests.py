@@ -1,7 +1,46 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from types import ModuleType
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import QueryDict
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.test.utils import CaptureQueriesContext
-from django.db import connection
-from django.urls import reverse
+from django.db import DataError, connection, connections
+from django.urls import include, path, reverse
+
+from .admin import ScalableProductAdmin
+from .cards import CompiledCards, card_renderer, compiled_cards, render_card_list
+from .engine import FilterEngine
+from .exports import iter_export_rows
+from .inventory import adjust_stock, stock_queue
+from .models import Brand, Category, PendingStockDelta, Product, ProductFacetSummary
+from . import optimizations
+from .optimizations import cache_key_for_request, prefetch_now, request_cache_key, schedule_prefetch
+from .partitions import rebalance_partitions
+from .rows import ProductRow, brand_names, category_names
+from .snapshot import build_snapshot, get_snapshot, is_dirty
+from .views import clear_dynamic
+from .warming import WARM_SENTINEL_KEY, combinations_from_log, needs_rewarm
+
+# filters.urls only mounts the debug toolbar when DEBUG is on at import time
+DEBUG_URLS = ModuleType("debug_urls")
+DEBUG_URLS.urlpatterns = [
+    path("__debug__/", include("debug_toolbar.urls")),
+    path("", include("filters.urls")),
+]
 
 
 class QueryCountTests(TestCase):
@@ -13,3 +52,633 @@ class QueryCountTests(TestCase):
             self.client.get(url)  # make a GET request to the view
         print("Query count:", len(ctx.captured_queries))
         self.assertLessEqual(len(ctx.captured_queries), 6)
+
+
+class FacetSummaryTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def cell_count(self, **filters):
+        return sum(ProductFacetSummary.objects.filter(**filters).values_list("count", flat=True))
+
+    def test_summary_follows_product_changes(self):
+        product = Product.objects.get(pk=1)
+        self.assertEqual(self.cell_count(price_bucket="50_100"), 1)
+
+        product.price = Decimal("250.00")
+        product.save()
+        self.assertEqual(self.cell_count(price_bucket="50_100"), 0)
+        self.assertEqual(self.cell_count(price_bucket="200_500"), 1)
+
+        product.delete()
+        self.assertEqual(self.cell_count(), 0)
+
+    def test_rebuild_matches_product_table(self):
+        ProductFacetSummary.objects.all().delete()
+        call_command("rebuild_facet_summary", stdout=StringIO())
+        self.assertEqual(self.cell_count(), Product.objects.count())
+        self.assertEqual(self.cell_count(status="active", price_bucket="50_100"), 1)
+
+    def test_deleted_brand_cells_are_merged(self):
+        product = Product.objects.get(pk=1)
+        Product.objects.create(name="No brand", category=product.category, brand=None,
+                               status=product.status, price=product.price)
+        product.brand.delete()
+        cells = ProductFacetSummary.objects.filter(brand__isnull=True)
+        self.assertEqual([cell.count for cell in cells], [2])
+
+        Product.objects.create(name="Another", category=product.category, brand=None,
+                               status=product.status, price=product.price)
+        self.assertEqual(self.cell_count(), Product.objects.count())
+
+    def test_ch_apply_facets_from_summary(self):
+        response = self.client.get(reverse("checkbox_apply_list"), {"status": "active"})
+        self.assertEqual(response.context["price_buckets"]["p_50_100"], 1)
+        self.assertEqual(response.context["category_facets"][0]["count"], 1)
+
+
+class CacheWarmingTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_popular_combinations_from_log(self):
+        log = [
+            '127.0.0.1 "GET /clear_dynamic/?status=active&category=1 HTTP/1.1" 200',
+            '{"path": "/clear_dynamic/?category=1&status=active"}',
+            '127.0.0.1 "GET /clear_dynamic/?page=2 HTTP/1.1" 200',
+            '127.0.0.1 "GET /multi_tags/?category=1 HTTP/1.1" 200',
+        ]
+        combos = combinations_from_log(log, top=1)
+        self.assertEqual(combos, [(("category", "1"), ("status", "active"))])
+
+    @override_settings(PRODUCTS_PREFETCH=True)
+    def test_warm_and_rewarm_after_invalidation(self):
+        with mock.patch.object(optimizations, "_prefetch_slots") as slots:
+            call_command("warm_products_cache", concurrency=1, stdout=StringIO())
+        slots.acquire.assert_not_called()  # warm renders don't start background prefetches
+        self.assertFalse(needs_rewarm())
+        for prefix in ("products:list", "products:list:multi"):
+            self.assertIsNotNone(cache.get(cache_key_for_request(prefix, [])))
+
+        Product.objects.get(pk=1).save()
+        self.assertTrue(needs_rewarm())
+
+    def test_sentinel_expires_before_warmed_pages(self):
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            call_command("warm_products_cache", concurrency=1, stdout=StringIO())
+        timeouts = {args[0]: kwargs["timeout"] for args, kwargs in cache_set.call_args_list}
+        sentinel = timeouts.pop(WARM_SENTINEL_KEY)
+        self.assertTrue(timeouts)
+        self.assertTrue(all(0 < sentinel < timeout for timeout in timeouts.values()))
+
+
+@override_settings(PRODUCTS_PREFETCH=False)
+class PrefetchTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.get(pk=1)
+        Product.objects.bulk_create(
+            Product(name=f"Product {i}", category=product.category, brand=product.brand,
+                    status="active", price=Decimal("10.00"))
+            for i in range(40)
+        )
+
+    def test_next_page_hint_and_prefetch(self):
+        url = reverse("clear_dynamic_list")
+        response = self.client.get(url, headers={"X-Requested-With": "XMLHttpRequest"})
+        hints = response.json()["prefetch"]
+        self.assertEqual(hints, [f"{url}?page=2"])
+
+        prefetch_now(clear_dynamic, hints)
+        self.assertIsNotNone(cache.get(cache_key_for_request("products:list", [("page", "2")])))
+
+    def test_full_page_link_header(self):
+        response = self.client.get(reverse("product_list_ajax"))
+        self.assertIn("page=2>; rel=prefetch", response["Link"])
+
+    @override_settings(PRODUCTS_PREFETCH=True)
+    def test_prefetch_skips_cached_pages_and_drops_when_busy(self):
+        url = reverse("clear_dynamic_list")
+        request = RequestFactory().get(url)
+        pool = mock.Mock()
+        self.enterContext(mock.patch.object(optimizations, "_prefetch_pool", pool))
+        self.enterContext(mock.patch.object(optimizations, "_prefetch_slots", threading.BoundedSemaphore(1)))
+
+        cache.set(cache_key_for_request("products:list", [("page", "2")]), {"gzip": b""})
+        schedule_prefetch(clear_dynamic, request, [f"{url}?page=2"], "products:list")
+        pool.submit.assert_not_called()
+
+        schedule_prefetch(clear_dynamic, request, [f"{url}?page=3"], "products:list")
+        schedule_prefetch(clear_dynamic, request, [f"{url}?page=4"], "products:list")
+        self.assertEqual(pool.submit.call_count, 1)  # the second batch found no free slot
+
+    @override_settings(PRODUCTS_PREFETCH_NEIGHBORS=True)
+    def test_neighbor_toggle_hints(self):
+        url = reverse("clear_dynamic_list")
+        response = self.client.get(url, {"status": "active"}, headers={"X-Requested-With": "XMLHttpRequest"})
+        hints = response.json()["prefetch"]
+        self.assertIn(f"{url}?", hints)
+        self.assertIn(f"{url}?status=active&status=inactive", hints)
+        self.assertIn(f"{url}?price_bucket=0_50&status=active", hints)
+
+
+class FilterEngineTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        product = Product.objects.get(pk=1)
+        self.other_brand = Brand.objects.create(name="Other Brand")
+        Product.objects.create(name="Other", category=product.category, brand=self.other_brand,
+                               status="inactive", price=Decimal("20.00"))
+
+    def test_repeated_brands_are_ored(self):
+        engine = FilterEngine(QueryDict(f"brand=1&brand={self.other_brand.pk}"))
+        self.assertEqual(engine.queryset.count(), 2)
+
+    def test_invalid_params_are_ignored(self):
+        response = self.client.get(
+            reverse("product_list_ajax"),
+            {"brand": "abc", "page": "xyz", "price_bucket": "cheap"},
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        invalid = [
+            {"brand": "\u00b2"}, {"category": "\u00b2"}, {"price_bucket": "\u00b2_5"},
+            {"min_price": "NaN"}, {"max_price": "Infinity"}, {"min_price": "sNaN"}, {"max_price": "1E+999999"},
+        ]
+        for name in ("manual_list", "clear_dynamic_list", "multi_tags_list", "product_list_ajax", "export_products"):
+            for params in invalid:
+                response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200, (name, params))
+
+    def test_price_bucket_and_category_name(self):
+        engine = FilterEngine(QueryDict("price_bucket=0_50&category=" + Category.objects.get(pk=1).name))
+        self.assertEqual([p.name for p in engine.queryset], ["Other"])
+
+    def test_page_renders_in_one_row_query(self):
+        engine = FilterEngine(QueryDict(""))
+        category_names.all(), brand_names.all()  # warm the name lookups
+        with CaptureQueriesContext(connection) as ctx:
+            [(p.name, p.category.name, p.brand.name, p.price) for p in engine.page]
+        self.assertEqual(len(ctx.captured_queries), 2)  # COUNT + rows
+
+    def test_lean_rows_render_like_models(self):
+        params = QueryDict("")
+        lean = FilterEngine(params, lean=True).page
+        orm = FilterEngine(params, lean=False).page
+        self.assertIsInstance(lean[0], ProductRow)
+        self.assertEqual(
+            render_to_string("products/partials/multi_tags_list.html", {"products": lean}),
+            render_to_string("products/partials/multi_tags_list.html", {"products": orm}),
+        )
+
+
+class ExportTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get(reverse("export_products"), {"status": "active"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,name,category,brand,status,price,created_at")
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Sample Product", lines[1])
+
+    def test_stock_needs_view_permission(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pass"))
+        response = self.client.get(reverse("export_products"), {"format": "jsonl", "status": "active"})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(records[0]["stock"], 10)
+
+    def test_jsonl_export_keyset_chunks(self):
+        product = Product.objects.get(pk=1)
+        Product.objects.bulk_create(
+            Product(name=f"Product {i}", category=product.category, brand=product.brand,
+                    status="inactive", price=Decimal("10.00"))
+            for i in range(5)
+        )
+        rows = list(iter_export_rows(FilterEngine(QueryDict("")).queryset, chunk_size=2))
+        self.assertEqual([row["id"] for row in rows], sorted(Product.objects.values_list("id", flat=True)))
+
+        response = self.client.get(reverse("export_products"), {"format": "jsonl", "status": "inactive"})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertNotIn("stock", records[0])
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("export_products"), {"format": "xml"})
+        self.assertEqual(response.status_code, 404)
+
+
+class CompiledCardsTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def test_compiled_cards_match_django_templates(self):
+        product = Product.objects.get(pk=1)
+        Product.objects.create(name='<b>"Tom & Jerry\'s"</b>', category=product.category, brand=None,
+                               status="active", price=Decimal("1234.50"))
+        for name in ("products/partials/multi_tags_list.html", "products/partials/filter_instant_list.html"):
+            compiled = compiled_cards(name)
+            self.assertIsNotNone(compiled)
+            for lean in (True, False):
+                page = FilterEngine(QueryDict(""), lean=lean).page
+                self.assertEqual(compiled.render(page), render_to_string(name, {"products": page}))
+            self.assertEqual(compiled.render([]), render_to_string(name, {"products": []}))
+
+    def test_card_list_renders_each_card_once(self):
+        name = "products/partials/multi_tags_list.html"
+        page = FilterEngine(QueryDict("")).page
+        for fast in (True, False):
+            with override_settings(PRODUCTS_FAST_CARDS=fast):
+                html, cards = render_card_list(name, page)
+                self.assertEqual(html, render_to_string(name, {"products": page}))
+                self.assertEqual([pk for pk, _ in cards], [product.id for product in page])
+                self.assertEqual(render_card_list(name, []), (render_to_string(name, {"products": []}), []))
+
+    def test_debug_rereads_edited_partials(self):
+        name = "products/partials/multi_tags_list.html"
+        with override_settings(PRODUCTS_FAST_CARDS=False, DEBUG=True):
+            first = card_renderer(name)
+            self.assertIsNot(card_renderer(name), first)
+        with override_settings(PRODUCTS_FAST_CARDS=False, DEBUG=False):
+            self.assertIs(card_renderer(name), card_renderer(name))
+
+    def test_templates_with_tags_are_not_compiled(self):
+        self.assertIsNone(CompiledCards.from_source("{% for product in products %}{{ product.name|upper }}{% empty %}{% endfor %}"))
+
+
+class StartupBudgetTests(SimpleTestCase):
+    """
+    Boot a worker with settings_production in a fresh interpreter and
+    hold it to an import-time budget (python -X importtime).
+    """
+    IMPORT_BUDGET_MS = 1000
+    DEV_ONLY_MODULES = ("debug_toolbar", "rest_framework", "widget_tweaks", "django.test", "faker", "factory")
+
+    def test_production_worker_import_budget(self):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE="filters.settings_production",
+            DJANGO_SECRET_KEY="startup-budget-test",
+        )
+        script = "import sys, filters.wsgi, filters.urls; print(' '.join(sys.modules))"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+
+        loaded = result.stdout.split()
+        for module in self.DEV_ONLY_MODULES:
+            self.assertNotIn(module, loaded)
+
+        self_times = [
+            int(line.split("|")[0].split(":")[1])
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:") and "self [us]" not in line
+        ]
+        self.assertLess(sum(self_times) / 1000, self.IMPORT_BUDGET_MS)
+
+
+class CatalogSnapshotTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "catalog.snapshot")
+        product = Product.objects.get(pk=1)
+        Product.objects.create(name="Cheap", category=product.category, brand=None,
+                               status="inactive", price=Decimal("20.00"))
+
+    def test_snapshot_matches_engine_queries(self):
+        with override_settings(PRODUCTS_SNAPSHOT_PATH=self.path):
+            self.assertEqual(build_snapshot(), 2)
+            snap = get_snapshot()
+            for query in ("", "status=inactive", "brand=1", "price_bucket=50_100&category=1"):
+                engine = FilterEngine(QueryDict(query))
+                rows = snap.matching(engine.category_ids, engine.brand_ids, engine.statuses, engine.price_range)
+                self.assertEqual(snap.ids(rows), list(engine.queryset.values_list("id", flat=True)))
+
+            counts = snap.facet_counts(snap.matching())
+            self.assertEqual(counts["status"], {"active": 1, "inactive": 1})
+            self.assertEqual(counts["price_bucket"], {"0_50": 1, "50_100": 1})
+            self.assertEqual(snap.ids(snap.sort(snap.matching(), "price")), [2, 1])
+
+    def test_top_bucket_includes_its_upper_bound(self):
+        Product.objects.filter(name="Cheap").update(price=Decimal("1000.00"))
+        with override_settings(PRODUCTS_SNAPSHOT_PATH=self.path):
+            build_snapshot()
+            snap = get_snapshot()
+            engine = FilterEngine(QueryDict("price_bucket=800_1000"))
+            rows = snap.matching(price_range=engine.price_range)
+            self.assertEqual(snap.ids(rows), list(engine.queryset.values_list("id", flat=True)))
+            self.assertEqual(len(rows), 1)
+
+    def test_engine_reads_from_fresh_snapshot(self):
+        with override_settings(PRODUCTS_SNAPSHOT_PATH=self.path, PRODUCTS_SNAPSHOT_READS=True):
+            build_snapshot()
+            engine = FilterEngine(QueryDict("min_price=10&max_price=30"))
+            self.assertIsNotNone(engine.snapshot)
+            self.assertEqual([row.name for row in engine.page], ["Cheap"])
+            self.assertEqual(engine.price_bucket_counts()["p_0_50"], 1)
+
+            Product.objects.filter(name="Cheap").get().save()
+            engine = FilterEngine(QueryDict("min_price=10&max_price=30"))
+            self.assertIsNone(engine.snapshot)
+            self.assertIsNone(engine.price_bucket_counts())
+            self.assertEqual([row.name for row in engine.page], ["Cheap"])
+
+    def test_changes_mark_snapshot_for_rebuild(self):
+        with override_settings(PRODUCTS_SNAPSHOT_PATH=self.path):
+            build_snapshot()
+            first = get_snapshot()
+            self.assertFalse(is_dirty())
+
+            Product.objects.filter(name="Cheap").get().delete()
+            self.assertTrue(is_dirty())
+            build_snapshot()
+            self.assertIsNot(get_snapshot(), first)
+            self.assertEqual(len(get_snapshot()), 1)
+
+
+@override_settings(PRODUCTS_STOCK_FLUSH_INTERVAL=0)
+class InventoryTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        cache.set("products:list:sentinel", "cached")
+
+    def test_stock_churn_keeps_list_caches(self):
+        self.assertEqual(adjust_stock({1: -3}), {1: 7})
+        Product.objects.get(pk=1).save(update_fields=["stock"])
+        self.assertEqual(cache.get("products:list:sentinel"), "cached")
+
+    def test_going_out_of_stock_invalidates(self):
+        adjust_stock({1: -10})
+        self.assertIsNone(cache.get("products:list:sentinel"))
+
+    def test_queue_coalesces_deltas(self):
+        for delta in (5, -2, 1):
+            stock_queue.add(1, delta)
+        self.assertEqual(stock_queue.pending(), {1: 4})
+        self.assertEqual(stock_queue.drain(), {1: 14})
+        self.assertEqual(stock_queue.pending(), {})
+
+    def test_queued_deltas_survive_a_failed_drain(self):
+        stock_queue.extend([(1, -4), (1, 1)])
+        self.assertEqual(PendingStockDelta.objects.count(), 2)
+        with mock.patch("products.inventory.adjust_stock", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                stock_queue.drain()
+        self.assertEqual(stock_queue.pending(), {1: -3})
+        self.assertEqual(stock_queue.drain(), {1: 7})
+        self.assertFalse(PendingStockDelta.objects.exists())
+
+    def test_rejected_product_does_not_block_the_queue(self):
+        stock_queue.extend([(1, 5), (2, 1), (1, 1)])
+        real_adjust = adjust_stock
+
+        def overflow_product_1(deltas):
+            if 1 in deltas:
+                raise DataError("integer out of range")
+            return real_adjust(deltas)
+
+        with mock.patch("products.inventory.adjust_stock", side_effect=overflow_product_1), \
+                self.assertLogs("products.inventory", "ERROR"):
+            self.assertEqual(stock_queue.drain(), {})  # product 2 isn't in the fixture
+        self.assertEqual(stock_queue.pending(), {})
+        self.assertEqual(list(PendingStockDelta.objects.values_list("product_id", "failed")), [(1, True), (1, True)])
+        stock_queue.add(1, 2)
+        self.assertEqual(stock_queue.drain(), {1: 12})
+
+    def test_adjust_endpoint_auth_and_bounds(self):
+        url = reverse("inventory_adjust")
+        body = json.dumps({"adjustments": [{"product": 1, "delta": 1}], "sync": True})
+        client = Client(enforce_csrf_checks=True)
+        with override_settings(PRODUCTS_INVENTORY_TOKENS=["secret"]):
+            response = client.post(url, body, content_type="application/json", headers={"Authorization": "Bearer wrong"})
+            self.assertEqual(response.status_code, 403)
+            response = client.post(url, body, content_type="application/json", headers={"Authorization": "Bearer secret"})
+            self.assertEqual(response.json(), {"stock": {"1": 11}})
+
+            client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+            self.assertEqual(client.post(url, body, content_type="application/json").status_code, 403)  # no CSRF token
+
+            huge = json.dumps({"adjustments": [{"product": 1, "delta": 10 ** 30}], "sync": True})
+            response = client.post(url, huge, content_type="application/json", headers={"Authorization": "Bearer secret"})
+            self.assertEqual(response.status_code, 400)
+
+    def test_adjust_endpoint(self):
+        url = reverse("inventory_adjust")
+        body = json.dumps({"adjustments": [{"product": 1, "delta": 2}, {"product": 1, "delta": 1}], "sync": True})
+        self.assertEqual(self.client.post(url, body, content_type="application/json").status_code, 403)
+
+        user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.json(), {"stock": {"1": 13}})
+        response = self.client.post(url, "[]", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CompressedPayloadTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("clear_dynamic_list")
+        self.ajax = {"X-Requested-With": "XMLHttpRequest"}
+
+    def test_gzip_body_is_cached_and_reused(self):
+        headers = {**self.ajax, "Accept-Encoding": "gzip, br"}
+        first = self.client.get(self.url, headers=headers)
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", first["Vary"])
+        payload = json.loads(gzip.decompress(first.content))
+        self.assertIn("Sample Product", payload["html"])
+
+        second = self.client.get(self.url, headers=headers)
+        self.assertEqual(second.content, first.content)
+
+        plain = self.client.get(self.url, headers=self.ajax)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain.json(), payload)
+
+    def test_diff_only_sends_unknown_cards_and_changed_tags(self):
+        headers = {**self.ajax, "X-Known-Cards": "", "X-Known-Tags": ""}
+        diff = self.client.get(self.url, {"status": "active"}, headers=headers).json()
+        self.assertEqual(diff["cards"]["order"], [1])
+        self.assertIn("Sample Product", diff["cards"]["html"]["1"])
+        self.assertEqual(diff["tags"]["keys"], ["status:active"])
+        self.assertIn("html", diff["tags"])
+
+        headers = {**self.ajax, "X-Known-Cards": "1", "X-Known-Tags": "status:active"}
+        diff = self.client.get(self.url, {"status": "active"}, headers=headers).json()
+        self.assertEqual(diff["cards"], {"order": [1], "html": {}})
+        self.assertNotIn("html", diff["tags"])
+
+    @override_settings(DEBUG=True, ROOT_URLCONF=DEBUG_URLS)
+    def test_cached_entries_render_with_debug_toolbar(self):
+        for name in ("clear_dynamic_list", "multi_tags_list", "product_list_ajax"):
+            for attempt in ("miss", "hit"):
+                response = self.client.get(reverse(name), headers=self.ajax)
+                self.assertEqual(response.status_code, 200, (name, attempt))
+
+    def test_instant_list_entries_skip_card_html(self):
+        self.client.get(reverse("product_list_ajax"), headers=self.ajax)
+        key = request_cache_key(RequestFactory().get(reverse("product_list_ajax")), "products:list:instant")
+        self.assertIsNone(cache.get(key).cards)
+
+
+PARTITION_DB = "partition_test"
+
+
+@override_settings(PRODUCTS_PARTITIONS={PARTITION_DB: [2]}, PRODUCTS_PARTITION_WORKERS=0)
+class PartitionTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # An in-memory partition database that only exists for this class
+        configured = connections.configure_settings(
+            {**connections.settings, PARTITION_DB: {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+        )
+        connections.settings[PARTITION_DB] = configured[PARTITION_DB]
+        # Allowed from here on, and covered by the per-test transactions
+        cls.databases = cls.databases | {PARTITION_DB}
+        call_command("migrate", "products", database=PARTITION_DB, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.databases = cls.databases - {PARTITION_DB}
+        connections[PARTITION_DB].close()
+        del connections[PARTITION_DB]
+        del connections.settings[PARTITION_DB]
+        super().tearDownClass()
+
+    def setUp(self):
+        self.brand = Brand.objects.create(name="Brand")
+        self.home = Category.objects.create(name="Home")
+        self.moved = Category.objects.create(name="Partitioned")
+        self.assertEqual(self.moved.pk, 2)
+        self.products = [
+            Product.objects.create(name=f"Product {i}", category=category, brand=self.brand,
+                                   status="active", price=Decimal("10.00"))
+            for i, category in enumerate([self.home, self.moved, self.home, self.moved])
+        ]
+
+    def test_products_are_routed_by_category(self):
+        self.assertEqual(Category.objects.using(PARTITION_DB).count(), 2)  # mirrored
+        self.assertEqual(Product.objects.using(PARTITION_DB).count(), 2)
+        self.assertEqual(Product.objects.count(), 2)
+        ids = [p.pk for p in self.products]
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_category_filter_touches_only_its_partition(self):
+        engine = FilterEngine(QueryDict(f"category={self.moved.pk}"))
+        self.assertEqual(engine.partitions, [PARTITION_DB])
+        category_names.all(), brand_names.all()  # warm the name lookups
+        with CaptureQueriesContext(connection) as ctx:
+            names = [p.name for p in engine.page]
+        self.assertEqual(names, ["Product 3", "Product 1"])
+        self.assertEqual(len(ctx.captured_queries), 0)  # nothing ran against default
+
+    def test_unfiltered_pages_merge_partitions(self):
+        engine = FilterEngine(QueryDict(""), per_page=3)
+        self.assertEqual(engine.page.paginator.count, 4)
+        self.assertEqual([p.name for p in engine.page], ["Product 3", "Product 2", "Product 1"])
+        orm = FilterEngine(QueryDict("page=2"), per_page=3, lean=False)
+        self.assertEqual([p.name for p in orm.page], ["Product 0"])
+
+    def test_filter_views_page_over_partitions(self):
+        for name in ("dj_filters_list", "checkbox_apply_list"):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.context["paginator"].count, 4)
+            self.assertEqual([p.name for p in response.context["products"]][:2], ["Product 3", "Product 2"])
+        response = self.client.get(reverse("checkbox_apply_list"), {"min_price": "5"})
+        self.assertEqual(response.context["price_buckets"]["p_0_50"], 4)
+
+    def test_rebalance_moves_misplaced_products(self):
+        with override_settings(PRODUCTS_PARTITIONS={PARTITION_DB: [self.home.pk, self.moved.pk]}):
+            self.assertEqual(rebalance_partitions(batch_size=1), 2)
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(Product.objects.using(PARTITION_DB).count(), 4)
+
+    def test_admin_counts_match_default_database_rows(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pass"))
+        response = self.client.get(reverse("admin:products_product_changelist"))
+        changelist = response.context["cl"]
+        self.assertEqual(changelist.result_count, len(changelist.result_list))
+        self.assertEqual(changelist.result_count, 2)
+        category_filter = next(f for f in changelist.filter_specs if f.parameter_name == "category")
+        self.assertEqual(category_filter.lookup_choices, [(str(self.home.pk), "Home (2)")])
+
+    def test_category_change_moves_product(self):
+        product = self.products[0]
+        product.category = self.moved
+        product.save()
+        self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+        self.assertEqual(Product.objects.using(PARTITION_DB).get(pk=product.pk).category_id, self.moved.pk)
+        cells = ProductFacetSummary.objects.filter(brand=self.brand, status="active")
+        self.assertEqual({cell.category_id: cell.count for cell in cells}, {self.home.pk: 1, self.moved.pk: 3})
+
+
+class AdminChangelistTests(TestCase):
+    fixtures = ["sample_products.json"]
+
+    def setUp(self):
+        product = Product.objects.get(pk=1)
+        for i in range(5):
+            Product.objects.create(name=f"Lotion {i}", category=product.category, brand=product.brand,
+                                   status="inactive", price=Decimal("10.00"))
+        user = User.objects.create_superuser("admin", "admin@example.com", "pass")
+        self.client.force_login(user)
+        self.url = reverse("admin:products_product_changelist")
+
+    def get(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries
+
+    def test_keyset_pages_without_count(self):
+        self.enterContext(mock.patch.object(ScalableProductAdmin, "list_per_page", 4))
+
+        response, queries = self.get()
+        cl = response.context["cl"]
+        self.assertTrue(cl.keyset)
+        self.assertEqual([p.name for p in cl.result_list], ["Lotion 4", "Lotion 3", "Lotion 2", "Lotion 1"])
+        self.assertEqual(cl.result_count, 6)  # from the facet summary
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"] and '"products_product"' in q["sql"]])
+
+        older = self.client.get(self.url + cl.older_url).context["cl"]
+        self.assertEqual([p.name for p in older.result_list], ["Lotion 0", "Sample Product"])
+        self.assertIsNone(older.older_url)
+        newer = self.client.get(self.url + older.newer_url).context["cl"]
+        self.assertEqual([p.pk for p in newer.result_list], [p.pk for p in cl.result_list])
+
+    def test_summary_filters_and_prefix_search(self):
+        response, _ = self.get({"status": "inactive"})
+        cl = response.context["cl"]
+        self.assertEqual(cl.result_count, 5)
+        category_filter = next(spec for spec in cl.filter_specs if spec.parameter_name == "category")
+        self.assertEqual(category_filter.lookup_choices, [("1", "Moisturizers (5)")])
+
+        response, _ = self.get({"q": "lotion 3"})
+        self.assertEqual([p.name for p in response.context["cl"].result_list], ["Lotion 3"])
+        response, _ = self.get({"q": "otion"})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+
+    def test_invalid_cursor_and_filter(self):
+        response, _ = self.get({"after": "nonsense"})
+        self.assertEqual(len(response.context["cl"].result_list), 6)
+        response, _ = self.get({"after": "2024-01-01T00:00:00_\u00b2", "q": "\u00b2"})
+        self.assertEqual(len(response.context["cl"].result_list), 0)
+        for value in ("abc", "\u00b2"):
+            response = self.client.get(self.url, {"category": value})
+            self.assertRedirects(response, self.url + "?e=1", fetch_redirect_response=False)
@@ -11,4 +11,6 @@ urlpatterns = [
     path("multi_tags/", views.product_list_multi, name="multi_tags_list"),
     path("clear_filters/", views.clear_filters, name="clear_filters"),
     path("clear_dynamic/", views.clear_dynamic, name="clear_dynamic_list"),
+    path("export/", views.export_products, name="export_products"),
+    path("inventory/adjust/", views.inventory_adjust, name="inventory_adjust"),
 ]
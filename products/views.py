@@ -1,17 +1,33 @@
-from django.db.models import Count, Case, When, IntegerField, Q
+import json
+from collections import Counter
+
+from django.db.models import Count, Case, When, IntegerField
 from django.shortcuts import render, redirect
-from django.core.paginator import Paginator
-from .models import Product, Category, Brand
+from .models import Product
 
 from django_filters.views import FilterView
 from .filters import ProductFilter
 
-from django.shortcuts import render
-
-from django.http import JsonResponse
-from django.template.loader import render_to_string
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.functional import cached_property
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
-from .optimizations import cache_products_response
+from .cards import render_cards
+from .engine import FilterEngine, price_range_q
+from .exports import EXPORT_FIELDS, EXPORT_FORMATS, PUBLIC_EXPORT_FIELDS, iter_export_rows
+from .inventory import MAX_DELTA, MAX_PRODUCT_ID, REJECTED_UPDATES, adjust_stock, has_inventory_token, stock_queue
+from .optimizations import (
+    add_prefetch_links,
+    cache_products_response,
+    entry_response,
+    make_entry,
+    prefetch_urls,
+    schedule_prefetch,
+)
+from .rows import brand_names, category_names
+from . import facets, partitions
 
 # Clear filters list
 def clear_filters(request):
@@ -20,205 +36,82 @@ def clear_filters(request):
     """
     return redirect("multi_tags_list")
 
-# Clear filters dynamic
-PRICE_BUCKETS = {
-    "0_50": (0, 50),
-    "50_100": (50, 100),
-    "100_200": (100, 200),
-    "200_500": (200, 500),
-    "500_800": (500, 800),
-    "800_1000": (800, 1000),
-}
-
 # Dynamic & optimized view
 def clear_dynamic(request):
-    # queries = Product.objects.all()
-    
-    # Optimized query 
-    queries = Product.objects.select_related("category", "brand").all()
-    
-    # Multi-select filters
-    selected_categories = [int(c) for c in request.GET.getlist("category") if c.isdigit()]
-    selected_statuses = request.GET.getlist("status")
-    selected_brands = [int(b) for b in request.GET.getlist("brand") if b.isdigit()]
-    
-    # Single brand and price bucket
-    selected_brand = request.GET.get("brand")
-    price_bucket = request.GET.get("price_bucket")
-    
-    # Merge brand filters
-    brand_ids = selected_brands + (
-        [int(selected_brand)] if selected_brand and selected_brand.isdigit() else []
-    )
-
-    # Apply filters
-    filters = Q()
-    if selected_categories:
-        filters &= Q(category__id__in=selected_categories)
-    if selected_statuses:
-        filters &= Q(status__in=selected_statuses)
-    if selected_brands:
-        filters &= Q(brand__id__in=selected_brands)
-    if price_bucket in PRICE_BUCKETS:
-        min_price, max_price = PRICE_BUCKETS[price_bucket]
-        filters &= Q(price__gte=min_price, price__lte=max_price)
+    engine = FilterEngine(request.GET, per_page=32)
+    products = engine.page
+    active_filters = engine.active_filters
     
-    queries = queries.filter(filters).order_by("-created_at")
+    # -- Speculative prefetch of the next page --
+    hints = prefetch_urls(request, products)
+    schedule_prefetch(clear_dynamic, request, hints, "products:list")
     
-    # if selected_brand and selected_brand.isdigit():
-    #    queries = queries.filter(brand__id=int(selected_brand))
-    
-    # Merge brands for display without duplicates
-    # brand_ids = list(set(selected_brands + ([int(selected_brand)] if selected_brand and selected_brand.isdigit() else [])))
-    
-    # Pagination
-    page = int(request.GET.get("page", 1))
-    paginator = Paginator(queries, 32)
-    products = paginator.get_page(page)
-    
-    # Active filters
-    active_filters = {
-        "category": Category.objects.filter(id__in=selected_categories),
-        "status": [sts for sts in Product.STATUS_CHOICES if sts[0] in selected_statuses],
-        "brand": Brand.objects.filter(id__in=brand_ids),
-        "price_bucket": price_bucket,
-    }
-    
-    # -- Cashing --
-    payload = cache_products_response(request, products, active_filters)
-    
-    # AJAX response
+    # AJAX response from the cache (pre-compressed, or a diff against the client's state)
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return JsonResponse(payload)
-       
-        # html = render_to_string("products/partials/multi_tags_list.html", {"products": products})
-        # tags_html = render_to_string("products/partials/active_filters.html", {"active_filters": active_filters})
-        # return JsonResponse(payload,  {"html": html, "tags_html": tags_html}) """
+        entry = cache_products_response(request, products, active_filters, hints)
+        return entry_response(request, entry)
         
     # context
     context = {
         "products": products,
         "page_obj": products,
-        "categories": Category.objects.all(),
+        "categories": category_names.all(),
         "statuses": Product.STATUS_CHOICES,
-        "brands": Brand.objects.all(),
+        "brands": brand_names.all(),
         "active_filters": active_filters,
-        "selected_categories": selected_categories,
-        "selected_statuses": selected_statuses,
-        "selected_brands": selected_brands,
-        "price_bucket": price_bucket,
-        "selected_brand": selected_brand,
+        **engine.selection_context(),
     }
     
     # Full page render
-    return render(
-        request,
-        "products/clear_filters_list.html",
-        context
+    return add_prefetch_links(
+        render(request, "products/clear_filters_list.html", context),
+        hints,
     )
 
 # Instant filtering via AJAX
 def product_list_ajax(request):
-    query = Product.objects.all()
-    
-    # Filters
-    category_ids = request.GET.getlist("category")
-    if category_ids:
-        query = query.filter(category_id__in=category_ids)
-    
-    brand = request.GET.get("brand")
-    if brand:
-        try:
-            query = query.filter(brand_id=int(brand))
-        except ValueError:
-            pass
-        query = query.filter(brand_id=int(brand))
-    
-    status = request.GET.getlist("status")
-    if status:
-        query = query.filter(status__in=status)
-    
-    price_bucket = request.GET.get("price_bucket")
-    if price_bucket and "_" in price_bucket:
-        try:
-            min_price, max_price = price_bucket.split("_")
-            query = query.filter(price__gte=int(min_price), price__lte=int(max_price))
-        except ValueError:
-            pass
-            
-    # Pagination
-    page = int(request.GET.get("page", 1))
-    paginator = Paginator(query, 32)
-    products = paginator.get_page(page)
+    engine = FilterEngine(request.GET, per_page=32)
+    products = engine.page
     
     # Context
     context = {
             "products": products,
             "page_obj": products,
-            "categories": Category.objects.all(),
+            "categories": category_names.all(),
             "statuses": Product.STATUS_CHOICES,
-            "brands": Brand.objects.all(),
+            "brands": brand_names.all(),
         }
     
+    # Speculative prefetch of the next page
+    hints = prefetch_urls(request, products)
+    schedule_prefetch(product_list_ajax, request, hints, "products:list:instant")
+    
     # If AJAX, return redered HTML of the product list only
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        html = render_to_string(
-            "products/partials/filter_instant_list.html",
-            context,
+        template_name = "products/partials/filter_instant_list.html"
+        entry = engine.cached_entry(
+            request,
+            "products:list:instant",
+            # No per-card HTML: this page's script always asks for the full payload
+            lambda: make_entry({"html": render_cards(template_name, products), "prefetch": hints}),
         )
-        return JsonResponse({"html": html})
+        return entry_response(request, entry)
     # Otherwise render full template
-    return render(
-        request,
-        "products/product_list_ajax.html",
-        context,
+    return add_prefetch_links(
+        render(request, "products/product_list_ajax.html", context),
+        hints,
     )
 
 # Multi-select tags
 def product_list_multi(request):
-    queries = Product.objects.all()
-    
-    # Multi-select filters
-    selected_categories = [int(c) for c in request.GET.getlist("category") if c.isdigit()]
-    selected_statuses = request.GET.getlist("status")
-    selected_brands = [int(b) for b in request.GET.getlist("brand") if b.isdigit()]
+    engine = FilterEngine(request.GET, per_page=32)
+    products = engine.page
+    active_filters = engine.active_filters
     
-    # Brand and price bucket
-    selected_brand = request.GET.get("brand")
-    price_bucket = request.GET.get("price_bucket")
-    
-    # Apply filters
-    if selected_categories:
-        queries = queries.filter(category__id__in=selected_categories)
-    if selected_statuses:
-        queries = queries.filter(status__in=selected_statuses)
-    if selected_brands:
-        queries = queries.filter(brand__id__in=selected_brands)
-    if selected_brand and selected_brand.isdigit():
-        queries = queries.filter(brand__id=int(selected_brand))
-    
-    if price_bucket in PRICE_BUCKETS:
-        min_price, max_price = PRICE_BUCKETS[price_bucket]
-        queries = queries.filter(price__gte=min_price, price__lte=max_price)
-    
-    # Active filters for display
-    active_filters = {
-        "category": Category.objects.filter(id__in=selected_categories),
-        "status": [sts for sts in Product.STATUS_CHOICES if sts[0] in selected_statuses],
-        "brand": Brand.objects.filter(id__in=selected_brands + ([int(selected_brand)] if selected_brand else [])),
-        "price_bucket": price_bucket,
-    }
-    
-    # Pagination
-    page = int(request.GET.get("page", 1))
-    paginator = Paginator(queries, 32)
-    products = paginator.get_page(page)
-    
-    # AJAX response
+    # AJAX response (pre-compressed, or a diff against the client's state)
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        html = render_to_string("products/partials/multi_tags_list.html", {"products": products})
-        tags_html = render_to_string("products/partials/active_filters.html", {"active_filters": active_filters})
-        return JsonResponse({"html": html, "tags_html": tags_html})
+        entry = cache_products_response(request, products, active_filters, prefix="products:list:multi")
+        return entry_response(request, entry)
     
     # Render full page
     return render(
@@ -227,18 +120,76 @@ def product_list_multi(request):
         {
             "products": products,
             "page_obj": products,
-            "categories": Category.objects.all(),
+            "categories": category_names.all(),
             "statuses": Product.STATUS_CHOICES,
-            "brands": Brand.objects.all(),
+            "brands": brand_names.all(),
             "active_filters": active_filters,
-            "selected_categories": selected_categories,
-            "selected_statuses": selected_statuses,
-            "selected_brands": selected_brands,
-            "price_bucket": price_bucket,
-            "selected_brand": selected_brand,
+            **engine.selection_context(),
         }
     )
     
+# Streaming export of a filter's full result set
+def export_products(request):
+    """
+    Stream every product matching the clear_dynamic / ProductFilter params
+    as CSV (default) or JSON Lines (?format=jsonl).
+    Stock levels are only included for users with the view_product permission.
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export format")
+    encode, content_type, extension = EXPORT_FORMATS[export_format]
+
+    fields = EXPORT_FIELDS if request.user.has_perm("products.view_product") else PUBLIC_EXPORT_FIELDS
+    engine = FilterEngine(request.GET)
+    response = StreamingHttpResponse(
+        encode(iter_export_rows(engine.queryset, aliases=engine.partitions, fields=fields), fields=fields),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="products.{extension}"'
+    return response
+    
+# Inventory API for high-frequency stock changes
+@csrf_exempt  # token callers have no CSRF cookie; session callers are checked below
+@require_POST
+def inventory_adjust(request):
+    """
+    Apply stock deltas without saving whole products.
+
+    Body: {"adjustments": [{"product": 1, "delta": -2}, ...], "sync": false}
+    Queued deltas are stored, then coalesced and written by the stock worker (202);
+    with "sync": true they are written now and the new stock levels returned.
+
+    Callers send "Authorization: Bearer <token>" with a PRODUCTS_INVENTORY_TOKENS
+    entry, or use a session with the change_product permission and a CSRF token.
+    """
+    if not has_inventory_token(request):
+        if not request.user.has_perm("products.change_product"):
+            return JsonResponse({"error": "Permission denied"}, status=403)
+        csrf_failure = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+        if csrf_failure is not None:
+            return csrf_failure
+    try:
+        body = json.loads(request.body)
+        adjustments = [(int(a["product"]), int(a["delta"])) for a in body["adjustments"]]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected {\"adjustments\": [{\"product\": id, \"delta\": n}]}"}, status=400)
+    if any(not 0 < pk <= MAX_PRODUCT_ID or abs(delta) > MAX_DELTA for pk, delta in adjustments):
+        return JsonResponse({"error": f"Product ids must be positive and deltas within ±{MAX_DELTA}"}, status=400)
+
+    if body.get("sync"):
+        deltas = {}
+        for product_id, delta in adjustments:
+            deltas[product_id] = deltas.get(product_id, 0) + delta
+        try:
+            new_stock = adjust_stock(deltas)
+        except REJECTED_UPDATES:
+            return JsonResponse({"error": "Stock out of range"}, status=400)
+        return JsonResponse({"stock": {str(pk): stock for pk, stock in new_stock.items()}})
+
+    stock_queue.extend(adjustments)
+    return JsonResponse({"queued": len(adjustments)}, status=202)
+    
 # Home page view
 def home(request):
     """
@@ -247,9 +198,26 @@ def home(request):
     """
     return render(request, "products/home.html")
 
+# FilterView pages across partitions
+class PartitionedFilterMixin:
+    """
+    With PRODUCTS_PARTITIONS set, page the filtered queryset over every
+    database holding matches; a plain queryset only reads the default one.
+    """
+
+    @cached_property
+    def engine(self):
+        return FilterEngine(self.request.GET)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        if partitions.is_partitioned():
+            queryset = partitions.PartitionedRows(queryset, self.engine.partitions, lean=False)
+        return super().get_paginator(queryset, per_page, **kwargs)
+
 # Facet sidebar phase 1 Checkbox + apply
-class ProductFilterChApplyView(FilterView):
+class ProductFilterChApplyView(PartitionedFilterMixin, FilterView):
     model = Product
+    queryset = FilterEngine.base_queryset()
     filterset_class = ProductFilter
     paginate_by = 24
     template_name = "products/ch_apply.html"
@@ -257,44 +225,37 @@ class ProductFilterChApplyView(FilterView):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        bucket = self.request.GET.get("price_bucket")
-        if bucket and "_" in bucket:
-            try:
-                min_val, max_val = map(int, bucket.split("_"))
-                queryset = queryset.filter(price__gte=min_val, price__lt=max_val)
-            except ValueError:
-                # Ignore invalid values
-                pass
-
+        price_range = self.engine.price_range
+        if price_range:
+            queryset = queryset.filter(price_range_q(*price_range))
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        queryset = self.get_queryset()
-        
-        # Category Facets
-        context['category_facets'] = (
-            Product.objects.values(
-                "category__id", "category__name"
-            ).annotate(count=Count('id')).order_by("-count")
-        )
-        
-        # Status facets
-        context['status_facets'] = (
-            Product.objects.values('status')
-            .annotate(count=Count('id'))
-        )
         
+        # Category & status facets from the precomputed summary
+        all_cells = facets.summary_cells()
+        context['category_facets'] = facets.category_facets(all_cells)
+        context['status_facets'] = facets.status_facets(all_cells)
         
         # Price Buckets
-        context['price_buckets'] = queryset.aggregate(
-            p_0_50=Count(Case(When(price__lt=50, then=1), output_field=IntegerField())),
-            p_50_100=Count(Case(When(price__gte=50, price__lt=100, then=1), output_field=IntegerField())),
-            p_100_200=Count(Case(When(price__gte=100, price__lt=200, then=1), output_field=IntegerField())),
-            p_200_500=Count(Case(When(price__gte=200, price__lt=500, then=1), output_field=IntegerField())),
-            p_500_800=Count(Case(When(price__gte=500, price__lt=800, then=1), output_field=IntegerField())),
-            p_800_1000=Count(Case(When(price__gte=800, price__lte=1000, then=1), output_field=IntegerField())),
-        )
+        price_buckets = self.engine.price_bucket_counts() if self.filterset.is_valid() else None
+        if price_buckets is not None:
+            context['price_buckets'] = price_buckets
+        else:
+            # Filters neither the summary nor the snapshot can answer
+            queryset = self.get_queryset()
+            price_buckets = Counter()
+            for counts in partitions.fan_out(lambda alias: queryset.using(alias).aggregate(
+                p_0_50=Count(Case(When(price__lt=50, then=1), output_field=IntegerField())),
+                p_50_100=Count(Case(When(price__gte=50, price__lt=100, then=1), output_field=IntegerField())),
+                p_100_200=Count(Case(When(price__gte=100, price__lt=200, then=1), output_field=IntegerField())),
+                p_200_500=Count(Case(When(price__gte=200, price__lt=500, then=1), output_field=IntegerField())),
+                p_500_800=Count(Case(When(price__gte=500, price__lt=800, then=1), output_field=IntegerField())),
+                p_800_1000=Count(Case(When(price__gte=800, price__lte=1000, then=1), output_field=IntegerField())),
+            ), self.engine.partitions):
+                price_buckets.update(counts)
+            context['price_buckets'] = dict(price_buckets)
         
         # Selected filters (pass to template)
         context['selected_categories'] = self.request.GET.getlist('category')
@@ -306,8 +267,9 @@ class ProductFilterChApplyView(FilterView):
         return context
 
 # Django Filters
-class ProductFilterView(FilterView):
+class ProductFilterView(PartitionedFilterMixin, FilterView):
     model = Product
+    queryset = FilterEngine.base_queryset()
     filterset_class = ProductFilter
     paginate_by = 24
     template_name = "products/dj_filters.html"
@@ -315,37 +277,12 @@ class ProductFilterView(FilterView):
     
 # Manual filtering with GET params
 def product_list(request):
-    qs = Product.objects.select_related("category","brand").all()
-    categories = Category.objects.all()
-    brands = Brand.objects.all()
-
-    # GET parameters
-    category = request.GET.get("category")
-    brand_id = request.GET.get("brand")
-    status = request.GET.get("status")
-    min_price = request.GET.get("min_price")
-    max_price = request.GET.get("max_price")
-
-    # Filters
-    if category:
-        qs = qs.filter(category__name=category.strip())
-    if brand_id:
-        qs = qs.filter(brand_id=brand_id)
-    if status:
-        qs = qs.filter(status=status.strip())
-
-    try:
-        if min_price:
-            qs = qs.filter(price__gte=float(min_price))
-        if max_price:
-            qs = qs.filter(price__lte=float(max_price))
-    except ValueError:
-        pass
+    engine = FilterEngine(request.GET, per_page=24)
+    categories = category_names.all()
+    brands = brand_names.all()
 
     # Pagination
-    paginator = Paginator(qs, 24)
-    page = request.GET.get("page")
-    products = paginator.get_page(page)
+    products = engine.page
 
     return render(
         request,
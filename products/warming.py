@@ -0,0 +1,132 @@
+# products/warming.py
+import json
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from urllib.parse import parse_qsl, urlsplit
+
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.urls import reverse
+
+from . import facets
+from .optimizations import LIST_CACHE_TTL
+from .views import clear_dynamic, product_list_multi
+from .workers import in_worker
+
+# Removed together with the cached pages by clear_products_cache
+WARM_SENTINEL_KEY = "products:list:warm"
+# Expires a minute before the pages it vouches for, so --watch re-warms them in time
+WARM_SENTINEL_TTL = LIST_CACHE_TTL - 60
+
+# URL name -> view of the AJAX list pages that cache their payloads
+WARM_VIEWS = {
+    "clear_dynamic_list": clear_dynamic,
+    "multi_tags_list": product_list_multi,
+}
+
+
+def normalize_query(items):
+    """
+    Sorted (key, value) pairs, the order cache_key_for_request hashes them in.
+    """
+    return tuple(sorted(items))
+
+
+def combinations_from_log(lines, path=None, top=50):
+    """
+    Most requested query strings for `path` in a traffic log.
+    Lines may be JSON objects with a "path"/"url" field or plain access-log lines.
+    """
+    path = path or reverse("clear_dynamic_list")
+    pattern = re.compile(re.escape(path) + r"(\?\S*)?")
+    counts = Counter()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        url = None
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+            if isinstance(record, dict):
+                url = record.get("path") or record.get("url")
+        if url is None:
+            match = pattern.search(line)
+            url = match.group(0) if match else None
+        if not url:
+            continue
+        parts = urlsplit(url)
+        if parts.path != path:
+            continue
+        counts[normalize_query(parse_qsl(parts.query, keep_blank_values=True))] += 1
+    return [combo for combo, _ in counts.most_common(top)]
+
+
+def combinations_from_facets(top=50, pages=1):
+    """
+    The unfiltered list plus the largest single-facet selections, by summary counts.
+    """
+    cells = facets.summary_cells()
+    scored = [((), float("inf"))]
+    scored += [((("category", str(row["category__id"])),), row["count"]) for row in facets.category_facets(cells)]
+    scored += [
+        ((("brand", str(row["brand__id"])),), row["count"])
+        for row in facets.brand_facets(cells)
+        if row["brand__id"] is not None
+    ]
+    scored += [((("status", row["status"]),), row["count"]) for row in facets.status_facets(cells)]
+    scored += [
+        ((("price_bucket", key[2:]),), count)
+        for key, count in facets.price_bucket_facets(cells).items()
+        if count
+    ]
+    scored.sort(key=lambda item: item[1], reverse=True)
+
+    combos = []
+    for combo, _ in scored[:top]:
+        combos.append(combo)
+        # Page 1 is requested without a page parameter
+        combos += [normalize_query(combo + (("page", str(page)),)) for page in range(2, pages + 1)]
+    return combos
+
+
+def render_combination(combo, view_name="clear_dynamic_list"):
+    """
+    Render one filter combination through a WARM_VIEWS view so it lands in the cache.
+    """
+    request = RequestFactory().get(
+        reverse(view_name),
+        list(combo),
+        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        HTTP_PURPOSE="prefetch",  # no further background prefetches from warm renders
+    )
+    request.refresh_cache = True  # overwrite a still-cached page to restart its TTL
+    return WARM_VIEWS[view_name](request).status_code == 200
+
+
+def warm_combinations(combos, concurrency=4, view_names=tuple(WARM_VIEWS)):
+    """
+    Pre-render the given combinations on every listed page, with at most
+    `concurrency` in flight. Returns the number of payloads warmed.
+    """
+    combos = list(dict.fromkeys(combos))
+    jobs = [(combo, view_name) for view_name in view_names for combo in combos]
+    if concurrency <= 1:
+        warmed = sum(render_combination(*job) for job in jobs)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            warmed = sum(pool.map(in_worker, repeat(render_combination), *zip(*jobs))) if jobs else 0
+    cache.set(WARM_SENTINEL_KEY, len(jobs), timeout=WARM_SENTINEL_TTL)
+    return warmed
+
+
+def needs_rewarm():
+    """
+    True once the cached pages were invalidated, or are about to expire,
+    since the last warm.
+    """
+    return cache.get(WARM_SENTINEL_KEY) is None
@@ -0,0 +1,15 @@
+# products/workers.py
+from django.db import close_old_connections
+
+
+def in_worker(func, *args):
+    """
+    Call func(*args) on a background pool thread. Connections are handled
+    like a request's: only broken ones and those past CONN_MAX_AGE are
+    closed, so a pool thread reuses its connections from task to task.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()